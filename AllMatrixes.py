@@ -1,52 +1,74 @@
 from typing import TypeVar
-from typing import Generic, Union
+from typing import Generic, Optional, Union
 from vi.config import Config, dataclass, deserialize, serialize
 from vi import Matrix
+# The models and their parameters are declared in parameters.py
+from parameters import MODEL_PARAMETERS, ALL_PARAMETERS
 
 MatrixFloat = TypeVar("MatrixFloat", float, list[float])
 MatrixInt = TypeVar("MatrixInt", int, list[int])
-    
+
+
+#######################################
+###             Schema              ###
+#######################################
+
+# Every parameter of every model is declared once here. AllConfig holds the values (and the defaults)
+# of a single run; AllMatrix takes a list per parameter to sweep over. Parameters left out of a matrix
+# are None there and get the AllConfig default.
+
 @dataclass
 class AllSchema(Generic[MatrixFloat, MatrixInt]):
 
+        # Model that runs the config, see parameters.MODEL_MODULES
+        model:                      Optional[Union[str, list[str]]] = None
+
         # Parameters of the foxes.
-        fox_energy:                 Union[int, MatrixInt] = 8 * 60        # When this runs out the fox dies. Eat to get more energy.
-        fox_hunger_threshold:       Union[int, MatrixInt] = 6  * 60       # When energy below this, Fox is hungry and looks for food.
-        rabbit_nutrition:           Union[int, MatrixInt] = 30 * 60       # Eating 1 rabbit gives this much energy
-        fox_lifespan:               Union[int, MatrixInt] = 3  * 60 * 60  # Foxes die from old age at 3 minutes
-        hunt_movespeed:             Union[float, MatrixFloat] = 1.5       # movement speed of fox when tracking scent or chasing rabbit
-        track_movespeed:            Union[float, MatrixFloat] = 2
-        fox_p_reproduce:            Union[float, MatrixFloat] = 0.3       # Probability of reproduction (create new fox)
+        fox_energy:                 Optional[Union[int, MatrixInt]] = None
+        fox_hunger_threshold:       Optional[Union[int, MatrixInt]] = None
+        rabbit_nutrition:           Optional[Union[int, MatrixInt]] = None
+        fox_lifespan:               Optional[Union[int, MatrixInt]] = None
+        hunt_movespeed:             Optional[Union[float, MatrixFloat]] = None
+        track_movespeed:            Optional[Union[float, MatrixFloat]] = None     # scent model only
+        fox_p_reproduce:            Optional[Union[float, MatrixFloat]] = None
 
         # Parameters of the rabbits.
-        rabbit_energy:              Union[int, MatrixInt] = 15 * 60       # When this runs out the rabbit dies. Eat to get more energy.
-        rabbit_hunger_threshold:    Union[int, MatrixInt] = 8  * 60       # When energy below this, Rabbit is hungry and looks for food.
-        grass_nutrition:            Union[int, MatrixInt] = 5  * 60       # Eating 1 grass gives this much energy
-        rabbit_lifespan:            Union[int, MatrixInt] = 3  * 60 * 60  # Rabbits die from old age at 3 minutes
-        rabbit_p_reproduce:         Union[float, MatrixFloat] = 0.3       # Probability of reproduction
+        rabbit_energy:              Optional[Union[int, MatrixInt]] = None
+        rabbit_hunger_threshold:    Optional[Union[int, MatrixInt]] = None
+        grass_nutrition:            Optional[Union[int, MatrixInt]] = None
+        rabbit_lifespan:            Optional[Union[int, MatrixInt]] = None
+        rabbit_p_reproduce:         Optional[Union[float, MatrixFloat]] = None
 
         # Parameters of the grass.
-        grass_t_reproduce:          Union[int, MatrixInt] = 4  * 60       # Delay between reproductions
+        grass_t_reproduce:          Optional[Union[int, MatrixInt]] = None
 
-        # Parameters of the scent.
-        scent:                      Union[int, MatrixInt] = 2  * 60       
-        scent_interval:             Union[int, MatrixInt] = 30            
+        # Parameters of the scent (scent model only).
+        scent:                      Optional[Union[int, MatrixInt]] = None
+        scent_interval:             Optional[Union[int, MatrixInt]] = None
 
-        max_fox: int    = Union[int, MatrixInt]
-        max_rabbit: int = Union[int, MatrixInt]
+        # Early termination.
+        stop_on_extinction:         Optional[Union[int, MatrixInt]] = None
+        steady_window:              Optional[Union[int, MatrixInt]] = None
+        steady_variance:            Optional[Union[float, MatrixFloat]] = None
+
+        # Population caps.
+        max_fox:                    Optional[Union[int, MatrixInt]] = None
+        max_rabbit:                 Optional[Union[int, MatrixInt]] = None
 
 @deserialize
 @serialize
 @dataclass
 class AllConfig(Config, AllSchema[list[float], list[int]]):
-        
+
+        model:                      str = "scent"
+
         # Parameters of the foxes.
         fox_energy:                 int = 8 * 60       # When this runs out the fox dies. Eat to get more energy.
         fox_hunger_threshold:       int = 6  * 60       # When energy below this, Fox is hungry and looks for food.
         rabbit_nutrition:           int = 30 * 60       # Eating 1 rabbit gives this much energy
         fox_lifespan:               int = 3  * 60 * 60  # Foxes die from old age at 3 minutes
         hunt_movespeed:             float = 1.5           # movement speed of fox when tracking scent or chasing rabbit
-        track_movespeed:            float = 1.5         
+        track_movespeed:            float = 1.5         # movement speed of fox when tracking scent
         fox_p_reproduce:            float = 0.3         # Probability of reproduction (create new fox)
 
         # Parameters of the rabbits.
@@ -60,37 +82,37 @@ class AllConfig(Config, AllSchema[list[float], list[int]]):
         grass_t_reproduce:          int = 4  * 60       # Delay between reproductions
 
         # Parameters of the scent.
-        scent:                      Union[int, MatrixInt] = 2  * 60     # COMMENT OUT IF USING BASE_MODEL
-        scent_interval:             Union[int, MatrixInt] = 30          # COMMENT OUT IF USING BASE_MODEL
+        scent:                      int = 2  * 60       # When this runs out the scent disappears
+        scent_interval:             int = 30            # How often rabbits drop a scent
+
+        # Early termination (off by default).
+        stop_on_extinction:         int = 0             # 1 = stop when the foxes or the rabbits have died out
+        steady_window:              int = 0             # Frames the populations must be steady for to stop, 0 = off
+        steady_variance:            float = 0.0         # Largest population variance over steady_window that counts as steady
 
         max_fox: int    = 100
         max_rabbit: int = 100
 
 @dataclass
 class AllMatrix(Matrix, AllSchema[list[float], list[int]]):
-        radius=[25, 50],
-        seed=[1, 2],
-        movement_speed=[1],
-        duration=[20*60],
-
-        fox_energy              = [8 * 60],
-        fox_hunger_threshold    = [6  * 60],
-        rabbit_nutrition        = [30 * 60],
-        fox_lifespan            = [3  * 60 * 60],
-        hunt_movespeed          = [2],
-        track_movespeed         = [3],
-        fox_p_reproduce         = [0.3],
-
-        rabbit_energy           = [12 * 60],
-        rabbit_hunger_threshold = [6  * 60],
-        grass_nutrition         = [5  * 60],
-        rabbit_lifespan         = [3  * 60 * 60],
-        rabbit_p_reproduce      = [0.3],
-
-        grass_t_reproduce       = [4  * 60],
-
-        scent                   = [2  * 60],
-        scent_interval          = [30],
-
-        max_fox                 = [500],
-        max_rabbit              = [500]
\ No newline at end of file
+        pass
+
+
+#######################################
+###          Run Parameters         ###
+#######################################
+
+class Params:
+    # Read-only parameters of one run of a model, built once from the config when the simulation starts.
+    # Agents read these instead of going through the config dataclass; only the model's own parameters are set.
+    __slots__ = ALL_PARAMETERS
+
+    def __init__(self, config: AllConfig, model: str):
+        for name in MODEL_PARAMETERS[model]:
+            object.__setattr__(self, name, getattr(config, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Run parameters are read-only")
+
+    def __reduce__(self):
+        raise TypeError("Run parameters are rebuilt from the config, not pickled")
@@ -0,0 +1,79 @@
+import pygame as pg
+from pygame.sprite import Sprite
+from vi.util import random_angle, random_pos
+
+
+#######################################
+###            Agent Pool           ###
+#######################################
+
+class AgentPool:
+    # Free lists of dead agents per class, reused for births instead of allocating new sprites.
+    # An agent that dies is parked until the next frame starts: within the frame it died in,
+    # the neighbour index, Violet's loop over all agents and its own update() may still hold it.
+
+    def __init__(self):
+        self._dying = []
+        self._free  = {}     # class -> dead agents that can be revived
+
+    def release(self, agent):
+        self._dying.append(agent)
+
+    def next_frame(self):
+        # Called at the start of every frame, before anything looks up the agents
+        for agent in self._dying:
+            self._free.setdefault(type(agent), []).append(agent)
+        self._dying = []
+
+    def take(self, cls):
+        # A dead agent of this class, or None when there is none to reuse
+        free = self._free.get(cls)
+        return free.pop() if free else None
+
+    def __len__(self):
+        return sum(len(free) for free in self._free.values()) + len(self._dying)
+
+
+# Attributes an agent gets during its life (or from on_spawn), a new agent doesn't have them yet
+_LIFE_ATTRIBUTES = ("pos", "_still_stuck", "_moving", "_image_cache")
+
+
+class Pooled:
+    # Mixin for agents that are recycled through shared.pool: kill() hands the agent to the pool
+    # and reproduce() revives a dead agent of the same class when there is one.
+    # A revived agent goes through the same steps, in the same order, as Violet's Agent.__init__
+    # and __copy__, so it makes the same random draws and a run gives the same result as without the pool.
+
+    def kill(self):
+        if self.alive():
+            super().kill()
+            self.shared.pool.release(self)
+
+    def reproduce(self):
+        child = self.shared.pool.take(type(self))
+        if child is None:
+            return super().reproduce()
+        child._revive(self)
+        return child
+
+    def _revive(self, parent):
+        sim = parent._Agent__simulation
+        Sprite.add(self, sim._all, sim._agents)
+        for name in _LIFE_ATTRIBUTES:
+            self.__dict__.pop(name, None)
+
+        self.id = sim._agent_id()
+        self._image_index = 0
+        self.move = random_angle(self.config.movement_speed, prng=self.shared.prng_move)
+        self.on_spawn()
+
+        # Unless on_spawn placed it, a new agent draws spawn positions until it is free of obstacles,
+        # then takes over the parent's position and movement
+        if not hasattr(self, "pos"):
+            while True:
+                self.pos = random_pos(self._area, prng=self.shared.prng_move)
+                obstacle_hit = pg.sprite.spritecollideany(self, self._obstacles, pg.sprite.collide_mask)
+                if not bool(obstacle_hit) and self._area.contains(self.rect):
+                    break
+        self.pos  = parent.pos.copy()
+        self.move = parent.move.copy()
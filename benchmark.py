@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from vi.config import Window
+import AllMatrixes
+import run_base_model_15
+import run_scent_model_15
+import vector_engine
+
+
+#######################################
+###         Benchmark Cases         ###
+#######################################
+
+# "vector" is the NumPy engine running the scent model, "tiled" the same with 2x2 tiles (tiled_engine.py).
+# Tiled cases run once per --processes count: tiled with one process against vector is what the halo
+# saves, tiled with N processes against one process is what the parallel searches save.
+MODELS = ["base", "scent", "vector", "tiled"]
+
+# Spawn counts (foxes, rabbits, grass), from the default population up to the 500 caps of the matrix
+SCALES = [(20, 20, 60), (100, 100, 300), (500, 500, 1500)]
+
+# Time of a tick is split into these phases; whatever is left over (scent decay, Violet bookkeeping) is "other"
+PHASES = ["index", "change_position", "update", "snapshot", "other"]
+
+# Import time budget of the modules every sweep worker loads, in a fresh interpreter.
+# Violet, pygame and polars alone take most of it and vary a lot between machines, so a budget is
+# the time of the libraries the module can't do without, measured in the same run, plus an allowance (ms)
+# for the module's own code. Plotting libraries must stay out of these. The benchmark fails over budget.
+IMPORT_BUDGET_MS = {
+    "run_scent_model_15": ("vi", 150),
+    "run_base_model_15":  ("vi", 150),
+    "vector_engine":      ("numpy, polars", 100),
+    "run_matrix_model":   ("vi", 150),
+}
+HEAVY_IMPORTS = ("seaborn", "matplotlib")
+
+
+#######################################
+###           Phase Timer           ###
+#######################################
+
+class PhaseTimer:
+    # Accumulates wall time per phase by wrapping methods on an instance.
+    # Times are exclusive: a timed call made inside another timed call (e.g. recorder.record
+    # inside an agent's update) is only counted for its own phase.
+
+    def __init__(self):
+        self.totals = dict.fromkeys(PHASES, 0)
+        self._inner = 0
+
+    def wrap(self, owner, name: str, phase: str):
+        method = getattr(owner, name)
+        timer = self
+
+        def timed(*args, **kwargs):
+            outer, timer._inner = timer._inner, 0
+            start = time.perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                timer.totals[phase] += elapsed - timer._inner
+                timer._inner = outer + elapsed
+
+        setattr(owner, name, timed)
+
+    def wrap_recorder(self, recorder):
+        for name in ("record", "record_many", "record_change", "record_changes", "end_frame", "close"):
+            if hasattr(recorder, name):
+                self.wrap(recorder, name, "snapshot")
+
+
+def instrument_violet(sim, timer: PhaseTimer):
+    # Neighbour index rebuild and Violet's own proximity chunks
+    timer.wrap(sim, "before_update", "index")
+    timer.wrap(sim._proximity, "update", "index")
+    # Violet calls change_position of every agent from this (name mangled) method
+    timer.wrap(sim, "_HeadlessSimulation__update_positions", "change_position")
+    timer.wrap(sim._all, "update", "update")
+    timer.wrap_recorder(sim.shared.recorder)
+
+def instrument_vector(engine, timer: PhaseTimer):
+    timer.wrap(engine, "move_foxes", "change_position")
+    timer.wrap(engine, "move_rabbits", "change_position")
+    timer.wrap(engine, "update_foxes", "update")
+    timer.wrap(engine, "update_rabbits", "update")
+    timer.wrap(engine, "regrow_grass", "update")
+    timer.wrap(engine, "_record", "snapshot")
+    timer.wrap(engine, "_record_grass", "snapshot")
+    # The neighbour searches, the only part the tiled engine runs in parallel
+    timer.wrap(engine, "_nearest", "index")
+    timer.wrap(engine, "_scent_pull", "index")
+    timer.wrap_recorder(engine.recorder)
+
+
+def run_case(case) -> dict:
+    # Runs in its own worker process, so the peak RSS belongs to this case only
+    model, (foxes, rabbits, grass), seed, duration, recording, world = case
+    config = AllMatrixes.AllConfig(duration=duration, seed=seed, radius=50)
+    if world is not None:
+        config.window = Window(*world)
+    out_dir = tempfile.mkdtemp(prefix="benchmark_")
+    timer = PhaseTimer()
+
+    if model == "vector" or model.startswith("tiled"):
+        tiles, processes = ((2, 2), int(model.split("/")[1])) if model.startswith("tiled") else (None, None)
+        sim = vector_engine.make_simulation(config, "scent", out_dir, recording, foxes=foxes, rabbits=rabbits, grass=grass,
+                                            tiles=tiles, processes=processes)
+        instrument_vector(sim, timer)
+        recorder = sim.recorder
+    else:
+        module = run_base_model_15 if model == "base" else run_scent_model_15
+        sim = module.make_simulation(config, out_dir, recording, foxes=foxes, rabbits=rabbits, grass=grass)
+        instrument_violet(sim, timer)
+        recorder = sim.shared.recorder
+
+    started = time.perf_counter_ns()
+    sim.run()
+    recorder.close()
+    total = time.perf_counter_ns() - started
+    shutil.rmtree(out_dir, ignore_errors=True)
+
+    timer.totals["other"] = total - sum(timer.totals.values())
+    ticks = duration + 1
+    return {
+        "model":          model,
+        "foxes":          foxes,
+        "rabbits":        rabbits,
+        "grass":          grass,
+        "seed":           seed,
+        "ticks":          ticks,
+        "recording":      recording,
+        "world":          list(config.window.as_tuple()),
+        "seconds":        total / 1e9,
+        "ticks_per_sec":  ticks / (total / 1e9),
+        "phase_ms":       {phase: ns / 1e6 for phase, ns in timer.totals.items()},
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb":    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+#######################################
+###           Import Times          ###
+#######################################
+
+def import_time(modules: str, repeat: int = 3) -> dict:
+    # Cumulative import time of `modules` (comma separated) from `python -X importtime`,
+    # best of `repeat` fresh interpreters, and the heavy libraries they pulled in
+    names = [name.strip() for name in modules.split(",")]
+    best, heavy = None, set()
+    for _ in range(repeat):
+        stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import "+modules],
+                                capture_output=True, text=True).stderr
+        ms = 0
+        for line in stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) != 3:
+                continue
+            name = fields[2].strip()
+            # Only the modules imported by the statement itself are not indented
+            if name in names and fields[2].startswith(" "+name):
+                ms += int(fields[1]) / 1000
+            elif name.split(".")[0] in HEAVY_IMPORTS:
+                heavy.add(name.split(".")[0])
+        best = ms if best is None else min(best, ms)
+    return {"ms": best, "heavy": sorted(heavy)}
+
+def budgeted_import_times(repeat: int = 5) -> dict:
+    # Import time and budget of every tracked module
+    floors = {}
+    timings = {}
+    for module, (needs, allowance) in IMPORT_BUDGET_MS.items():
+        if needs not in floors:
+            floors[needs] = import_time(needs, repeat)["ms"]
+        timings[module] = {**import_time(module, repeat), "budget_ms": floors[needs] + allowance}
+    return timings
+
+def over_budget(timing: dict) -> bool:
+    return timing["ms"] > timing["budget_ms"]
+
+def print_import_time(module: str, timing: dict):
+    over = over_budget(timing)
+    flag = ("  OVER BUDGET" if over else "") + ("  imports "+", ".join(timing["heavy"]) if timing["heavy"] else "")
+    print("import %-22s %7.0f ms  (budget %d ms)%s" % (module, timing["ms"], timing["budget_ms"], flag))
+
+
+#######################################
+###             Results             ###
+#######################################
+
+def git_commit() -> str:
+    # Short hash of HEAD, marked dirty when tracked files have uncommitted changes
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"]).returncode != 0
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def case_name(result: dict) -> str:
+    return "%s %d/%d/%d seed %d" % (result["model"], result["foxes"], result["rabbits"], result["grass"], result["seed"])
+
+def print_result(result: dict):
+    phases = "  ".join("%s %.0fms" % (phase, ms) for phase, ms in result["phase_ms"].items())
+    print("%-28s %8.1f ticks/s  %7.1f MB  %s" % (case_name(result), result["ticks_per_sec"], result["peak_rss_mb"], phases))
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.1):
+    # Ticks/sec and peak RSS of every case that is in both runs, flagging slowdowns beyond the tolerance
+    previous = {case_name(result): result for result in baseline["results"]}
+    print()
+    print("Compared to "+baseline["commit"]+":")
+    for result in current["results"]:
+        old = previous.get(case_name(result))
+        if old is None:
+            continue
+        speedup = result["ticks_per_sec"] / old["ticks_per_sec"]
+        flag = "  SLOWER" if speedup < 1 - tolerance else ""
+        print("%-28s %5.2fx ticks/s  %+7.1f MB%s" % (case_name(result), speedup, result["peak_rss_mb"] - old["peak_rss_mb"], flag))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the simulation models at several population scales")
+    parser.add_argument("--models", nargs="+", default=MODELS, choices=MODELS)
+    parser.add_argument("--scales", nargs="+", default=[",".join(map(str, scale)) for scale in SCALES],
+                        help="spawn counts as foxes,rabbits,grass")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[1])
+    parser.add_argument("--world", default=None, help="world size as width,height, the default window otherwise")
+    parser.add_argument("--processes", nargs="+", type=int, default=[1, os.cpu_count()],
+                        help="worker processes of the tiled cases")
+    parser.add_argument("--duration", type=int, default=600)
+    parser.add_argument("--recording", default="snapshots", choices=["snapshots", "counts"])
+    parser.add_argument("--out", default=None, help="results file, benchmarks/<commit>.json by default")
+    parser.add_argument("--compare", default=None, help="results file of an earlier run to compare against")
+    parser.add_argument("--skip-imports", action="store_true", help="don't measure module import times")
+    args = parser.parse_args()
+
+    imports = {}
+    if not args.skip_imports:
+        imports = budgeted_import_times()
+        for module, timing in imports.items():
+            print_import_time(module, timing)
+        print()
+
+    scales = [tuple(int(count) for count in scale.split(",")) for scale in args.scales]
+    models = []
+    for model in args.models:
+        models += ["tiled/%d" % processes for processes in sorted(set(args.processes))] if model == "tiled" else [model]
+    world = tuple(int(size) for size in args.world.split(",")) if args.world else None
+    cases = [(model, scale, seed, args.duration, args.recording, world) for model in models for scale in scales for seed in args.seeds]
+
+    # One case at a time, each in a fresh process, so the cases don't compete for cores or share peak memory
+    results = []
+    # The executor's workers aren't daemons, so the tiled cases can start their own workers
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn"), max_tasks_per_child=1) as p:
+        for result in p.map(run_case, cases):
+            print_result(result)
+            results.append(result)
+
+    commit = git_commit()
+    report = {
+        "commit":   commit,
+        "time":     time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python":   platform.python_version(),
+        "machine":  platform.machine(),
+        "cpus":     os.cpu_count(),
+        "imports":  imports,
+        "results":  results,
+    }
+    out = args.out or os.path.join("benchmarks", commit + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print()
+    print("Results written to "+out)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+    over = [module for module, timing in imports.items() if over_budget(timing)]
+    if over:
+        print()
+        print("Import time over budget: "+", ".join(over))
+        sys.exit(1)
@@ -0,0 +1,101 @@
+import os
+import pickle
+import random
+from pygame.math import Vector2
+
+
+#######################################
+###           Checkpoints           ###
+#######################################
+
+# Simple values of an agent that are saved; references to the simulation, images etc. are rebuilt on resume
+_SIMPLE = (int, float, bool, str, type(None))
+
+
+def _fields(agent) -> dict:
+    # Instance dict plus the __slots__ fields of the agent's classes that are set
+    fields = dict(vars(agent))
+    for cls in type(agent).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if hasattr(agent, name):
+                fields[name] = getattr(agent, name)
+    return fields
+
+def _agent_state(agent) -> dict:
+    fields = {name: value for name, value in _fields(agent).items() if isinstance(value, _SIMPLE)}
+    return {
+        "kind":   type(agent).__name__,
+        "fields": fields,
+        "pos":    (agent.pos.x, agent.pos.y),
+        "move":   (agent.move.x, agent.move.y),
+    }
+
+
+class Checkpointer:
+    # Saves the full state of a running Violet simulation every `every` frames and restores it on resume:
+    # every agent's fields, the frame counter, Python's `random` state, `shared.prng_move`,
+    # and the objects on `shared` listed in `shared_names` (recorder, scent field, ...).
+
+    def __init__(self, path: str, every: int, shared_names=("recorder",)):
+        self.path         = path
+        self.every        = every
+        self.shared_names = shared_names
+
+    def load(self):
+        # The latest checkpoint, or None when the simulation has to start from scratch
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as f:
+            return pickle.load(f)
+
+    def after_tick(self, sim):
+        # The last frame is never saved, the run is finished at that point
+        if sim.config.duration > 0 and sim.shared.counter >= sim.config.duration:
+            return
+        if (sim.shared.counter + 1) % self.every == 0:
+            self.save(sim)
+
+    def save(self, sim):
+        state = {
+            "frame":         sim.shared.counter + 1,   # The frame to continue with
+            "next_agent_id": sim._next_agent_id,
+            "random":        random.getstate(),
+            "prng_move":     sim.shared.prng_move.getstate(),
+            "agents":        [_agent_state(agent) for agent in sim.all_agents()],
+            "shared":        {name: getattr(sim.shared, name) for name in self.shared_names},
+        }
+        # Write to a temporary file first so a crash while saving never corrupts the previous checkpoint
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(self.path + ".tmp", self.path)
+
+    def restore(self, sim, state, agent_classes: dict):
+        # agent_classes maps the class name to (class, image paths), like batch_spawn_agents takes them.
+        # Agents are recreated one by one in their original order, so updates happen in the same order.
+        images = {name: sim._load_images(paths) for name, (_, paths) in agent_classes.items()}
+        for saved in state["agents"]:
+            cls, _ = agent_classes[saved["kind"]]
+            agent = cls(images=images[saved["kind"]], simulation=sim)
+            for name, value in saved["fields"].items():
+                setattr(agent, name, value)
+            agent.pos  = Vector2(saved["pos"])
+            agent.move = Vector2(saved["move"])
+
+        for name, value in state["shared"].items():
+            current = getattr(sim.shared, name, None)
+            if type(current) is type(value):
+                # Update in place, other objects (e.g. the neighbour index) may hold a reference to it
+                vars(current).update(vars(value))
+            else:
+                setattr(sim.shared, name, value)
+
+        sim._next_agent_id = state["next_agent_id"]
+        sim.shared.counter = state["frame"]
+        # Restore the random generators last, spawning the agents above draws from them
+        random.setstate(state["random"])
+        sim.shared.prng_move.setstate(state["prng_move"])
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
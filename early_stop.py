@@ -0,0 +1,51 @@
+import numpy as np
+
+
+#######################################
+###          Early Stopping         ###
+#######################################
+
+class EarlyStop:
+    # Stop conditions checked once per frame with the fox and rabbit populations.
+    #   stop_on_extinction = 1: stop as soon as the foxes or the rabbits have died out
+    #   steady_window > 0:      stop once the variance of both populations over the last
+    #                           steady_window frames is at most steady_variance
+    # Both are off by default, so a run always lasts the full duration.
+
+    def __init__(self, config):
+        self.extinction = config.stop_on_extinction
+        self.window     = config.steady_window
+        self.variance   = config.steady_variance
+        # Ring buffer with the populations of the last `window` frames
+        self._history   = np.zeros((2, max(self.window, 1)), dtype=np.int32)
+        self._seen      = 0
+        # Reason found at the end of the previous frame
+        self._pending   = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.extinction) or self.window > 0
+
+    def after_frame(self, foxes: int, rabbits: int):
+        # The reason to stop after this frame, or None to keep going, given the populations left at its end.
+        # A frame's recorded rows still include the animals that died in it, so the run goes on for one
+        # more frame once a condition is met: its last row then shows what it stopped for.
+        reason, self._pending = self._pending, self.check(foxes, rabbits)
+        return reason
+
+    def check(self, foxes: int, rabbits: int):
+        # The reason to stop after this frame, or None to keep going
+        if self.extinction:
+            if foxes == 0 and rabbits == 0:
+                return "extinction"
+            if foxes == 0:
+                return "fox_extinction"
+            if rabbits == 0:
+                return "rabbit_extinction"
+
+        if self.window > 0:
+            self._history[:, self._seen % self.window] = (foxes, rabbits)
+            self._seen += 1
+            if self._seen >= self.window and self._history.var(axis=1).max() <= self.variance:
+                return "steady_state"
+        return None
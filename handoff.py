@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import polars as pl
+
+
+# Handoff files go to memory-backed storage where there is one, so they never touch the disk
+HANDOFF_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+# Columns start at a multiple of this many bytes in a handoff file
+ALIGN = 64
+
+
+#######################################
+###             Handoff             ###
+#######################################
+
+class Handoff:
+    # What a sweep worker sends back instead of its result table: where the table's columns are.
+    # The worker writes the columns to a file in the sweep's handoff directory and only this small
+    # record is pickled to the driver, which maps the file and builds the table on top of it.
+    # Numeric columns are views on the file, no copy is made. Boolean columns are stored a byte per row
+    # and string columns as codes into their distinct values, both are rebuilt on load.
+    # Columns with nulls are rare and travel with the record.
+
+    def __init__(self, path: str, height: int, columns: list, inline: pl.DataFrame):
+        self.path    = path
+        self.height  = height
+        self.columns = columns     # (name, numpy dtype, offset, distinct strings) per column in table order
+        self.inline  = inline
+
+    def load(self) -> pl.DataFrame:
+        data = np.memmap(self.path, mode="r") if os.path.getsize(self.path) else np.empty(0, dtype=np.uint8)
+        series = []
+        for name, dtype, offset, strings in self.columns:
+            if dtype is None:
+                series.append(self.inline[name])
+                continue
+            dtype = np.dtype(dtype)
+            values = data[offset:offset + self.height * dtype.itemsize].view(dtype)
+            if strings is not None:
+                series.append(pl.Series(name, strings, dtype=pl.String).gather(values))
+            else:
+                series.append(pl.Series(name, values))
+        return pl.DataFrame(series, height=self.height)
+
+    def release(self):
+        # The last reader removes the file. Tables loaded from it stay valid where the OS allows it (POSIX),
+        # elsewhere the file is left to the handoff directory's cleanup.
+        try:
+            os.remove(self.path)
+        except (FileNotFoundError, PermissionError):
+            pass
+
+
+def _encode(series: pl.Series):
+    # The column as a NumPy array to write and the distinct strings its codes point into,
+    # None when the column travels with the record
+    if series.null_count():
+        return None, None
+    if series.dtype == pl.String:
+        strings = series.unique(maintain_order=True).to_list()
+        return series.cast(pl.Enum(strings)).to_physical().to_numpy(), strings
+    if series.dtype.is_numeric() or series.dtype == pl.Boolean:
+        return np.ascontiguousarray(series.to_numpy()), None
+    return None, None
+
+def export(df: pl.DataFrame, directory: str, name: str) -> Handoff:
+    # Write a result table to directory/name.cols and return the record to send back in its place
+    path = os.path.join(directory, name + ".cols")
+    columns = []
+    inline = []
+    offset = 0
+    with open(path + ".tmp", "wb") as f:
+        for series in df.get_columns():
+            values, strings = _encode(series)
+            if values is None:
+                columns.append((series.name, None, None, None))
+                inline.append(series)
+                continue
+            f.write(bytes(-offset % ALIGN))
+            offset += -offset % ALIGN
+            columns.append((series.name, values.dtype.str, offset, strings))
+            f.write(memoryview(values).cast("B"))
+            offset += values.nbytes
+    # A worker that is restarted halfway through a job may write the same name again
+    os.replace(path + ".tmp", path)
+    return Handoff(path, df.height, columns, pl.DataFrame(inline))
+
+
+#######################################
+###        Handoff Directory        ###
+#######################################
+
+class HandoffDir:
+    # Directory for the handoff files of one sweep, removed with everything in it when the sweep ends.
+    # That also cleans up after workers that died between writing a result and the driver reading it.
+
+    def __init__(self, root: str = HANDOFF_ROOT):
+        self.path = tempfile.mkdtemp(prefix="handoff-", dir=root)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
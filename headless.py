@@ -0,0 +1,81 @@
+from itertools import chain
+import pygame as pg
+
+
+#######################################
+###        Image-less Agents        ###
+#######################################
+
+class PointAgent:
+    # Mixin for agents of a headless run: a point with a bounding box of `size` instead of a sprite.
+    # No surface is loaded or drawn, image swaps are no-ops and obstacles are
+    # tested against the bounding box instead of pixel masks.
+    size = (8, 8)   # Size of the agent's sprite image, only used for collisions and spawning
+
+    @property
+    def image(self):
+        return None
+
+    @property
+    def rect(self) -> pg.Rect:
+        rect = pg.Rect(0, 0, *self.size)
+        rect.center = self.center
+        return rect
+
+    @property
+    def mask(self) -> pg.mask.Mask:
+        # Solid box, for Violet's own obstacle checks while spawning
+        return pg.mask.Mask(self.size, fill=True)
+
+    def change_image(self, index: int):
+        pass
+
+    def hits_obstacle(self) -> bool:
+        # Geometric replacement of spritecollideany(self, self._obstacles, collide_mask)
+        if not self._obstacles:
+            return False
+        rect = self.rect
+        return any(rect.colliderect(obstacle.rect) for obstacle in self._obstacles)
+
+
+class StaticAgent:
+    # Mixin for agents that never move and have nothing to do in update (grass): other agents and the
+    # simulation change them. ImagelessSimulation.set_aside_static keeps them out of Violet's per-tick loops.
+    pass
+
+
+class NoProximity:
+    # Stands in for Violet's ProximityEngine, which sorts every agent into chunks each tick for in_proximity_*.
+    # The models ask the NeighbourIndex instead, so nothing would read the chunks. Agents that still call
+    # in_proximity_* fail on this instead of quietly finding no one.
+
+    def _set_radius(self, radius: float):
+        pass
+
+    def update(self):
+        pass
+
+
+class ImagelessSimulation:
+    # Mixin for a HeadlessSimulation whose agents are PointAgents: agent images are never loaded from disk
+    # and Violet's proximity chunks are never built
+    _static = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._proximity = NoProximity()
+
+    def _load_images(self, images: list) -> list:
+        return []
+
+    def set_aside_static(self):
+        # Violet calls change_position and update of everything in its agent groups every tick and has no way
+        # to leave agents out, so the StaticAgents are moved to a group of their own. Being in a group keeps
+        # them alive (is_alive), and they are still found through all_agents (neighbour index, checkpoints).
+        self._static = pg.sprite.Group()
+        for agent in [agent for agent in self._agents if isinstance(agent, StaticAgent)]:
+            agent.remove(self._all, self._agents)
+            self._static.add(agent)
+
+    def all_agents(self):
+        return chain(self._agents, self._static)
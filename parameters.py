@@ -0,0 +1,39 @@
+import importlib
+
+
+#######################################
+###              Models             ###
+#######################################
+
+# Names of the models and of their parameters. This module imports nothing heavy,
+# so the result cache and the vector engine can use it without loading Violet and pygame.
+
+# Module that runs each model, imported when a run of that model is asked for
+# vector_base and vector_scent are the same models on the NumPy engine (vector_engine.py)
+MODEL_MODULES = {
+    "base":         "run_base_model_15",
+    "scent":        "run_scent_model_15",
+    "vector_base":  "vector_engine",
+    "vector_scent": "vector_engine",
+}
+
+# Parameters of the agents that every model reads
+COMMON_PARAMETERS = (
+    "fox_energy", "fox_hunger_threshold", "rabbit_nutrition", "fox_lifespan", "hunt_movespeed", "fox_p_reproduce",
+    "rabbit_energy", "rabbit_hunger_threshold", "grass_nutrition", "rabbit_lifespan", "rabbit_p_reproduce",
+    "grass_t_reproduce",
+)
+
+# Parameters each model reads. A model ignores the others, so they don't make runs of it different
+MODEL_PARAMETERS = {
+    "base":  COMMON_PARAMETERS,
+    "scent": COMMON_PARAMETERS + ("track_movespeed", "scent", "scent_interval"),
+}
+MODEL_PARAMETERS["vector_base"]  = MODEL_PARAMETERS["base"]
+MODEL_PARAMETERS["vector_scent"] = MODEL_PARAMETERS["scent"]
+
+ALL_PARAMETERS = tuple(dict.fromkeys(name for names in MODEL_PARAMETERS.values() for name in names))
+
+
+def model_module(model: str):
+    return importlib.import_module(MODEL_MODULES[model])
@@ -0,0 +1,106 @@
+import json
+import os
+import time
+from collections import defaultdict
+
+
+#######################################
+###             Profiler            ###
+#######################################
+
+class Profiler:
+    # Opt-in instrumentation of the hot paths of a Violet simulation.
+    # Counts calls and cumulative nanoseconds per (agent kind, phase): the update and change_position
+    # of every agent class, recording, proximity queries and the scent field bookkeeping.
+    # Times are exclusive, so e.g. recorder.record called inside Fox.update only counts as "record".
+    #
+    # Methods are replaced on the classes while attached, which keeps the patched objects picklable
+    # for checkpoints. Attach to one simulation per process at a time.
+
+    def __init__(self):
+        self.calls    = defaultdict(int)
+        self.ns       = defaultdict(int)
+        self._inner   = 0
+        self._patched = []
+
+    def patch(self, owner: type, name: str, phase: str, kind: str = None, subject: int = 0):
+        # Time every call of owner.name. Without a fixed kind, the kind is the class name of argument
+        # number `subject`: 0 is the agent itself for its own methods, 1 the agent passed to e.g. the index.
+        original = owner.__dict__.get(name)
+        method = getattr(owner, name)
+        profiler = self
+        calls, ns = self.calls, self.ns
+
+        def timed(*args, **kwargs):
+            key = (kind or type(args[subject]).__name__, phase)
+            outer, profiler._inner = profiler._inner, 0
+            start = time.perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                calls[key] += 1
+                ns[key] += elapsed - profiler._inner
+                profiler._inner = outer + elapsed
+
+        setattr(owner, name, timed)
+        self._patched.append((owner, name, original))
+
+    def attach(self, sim, agent_classes):
+        for cls in agent_classes:
+            self.patch(cls, "update", "update")
+            self.patch(cls, "change_position", "change_position")
+            if hasattr(cls, "regrow"):
+                self.patch(cls, "regrow", "regrow")
+            if hasattr(cls, "sense"):
+                self.patch(cls, "sense", "sense")
+
+        shared = sim.shared
+        # Called as record(agent, kind, ...) and neighbours(agent), so the kind is that of the agent
+        self.patch(type(shared.recorder), "record", "record", subject=1)
+        self.patch(type(shared.recorder), "record_change", "record", subject=1)
+        index = type(shared.index)
+        self.patch(index, "rebuild", "index_rebuild", kind="simulation")
+        self.patch(index, "neighbours", "neighbours", subject=1)
+        self.patch(type(shared.recorder), "end_frame", "flush", kind="simulation")
+
+        scent_field = getattr(shared, "scent_field", None)
+        if scent_field is not None:
+            for name in ("deposit", "near", "drop_owner", "decay"):
+                self.patch(type(scent_field), name, name, kind="scent")
+
+    def detach(self):
+        # Put the original methods back; inherited ones are removed again from the subclass
+        for owner, name, original in reversed(self._patched):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._patched = []
+
+    def summary(self) -> list:
+        # One row per (kind, phase), most expensive first
+        total = sum(self.ns.values()) or 1
+        rows = [
+            {
+                "kind":     kind,
+                "phase":    phase,
+                "calls":    self.calls[(kind, phase)],
+                "ms":       ns / 1e6,
+                "us_call":  ns / 1e3 / max(self.calls[(kind, phase)], 1),
+                "share":    ns / total,
+            }
+            for (kind, phase), ns in self.ns.items()
+        ]
+        return sorted(rows, key=lambda row: row["ms"], reverse=True)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def print_summary(self):
+        print("%-12s %-16s %10s %10s %9s %6s" % ("kind", "phase", "calls", "ms", "us/call", "share"))
+        for row in self.summary():
+            print("%-12s %-16s %10d %10.1f %9.2f %5.1f%%" % (
+                row["kind"], row["phase"], row["calls"], row["ms"], row["us_call"], 100 * row["share"]))
@@ -0,0 +1,293 @@
+import json
+import os
+import numpy as np
+import polars as pl
+
+
+#######################################
+###         Snapshot Layout         ###
+#######################################
+
+# Every kind of agent that shows up in the `agent` column
+AGENT_KINDS = ["fox", "rabbit", "grass", "dead_grass"]
+
+# Column order and (narrow) dtypes of the snapshot files
+SNAPSHOT_SCHEMA = {
+    "frame":        pl.Int32,
+    "id":           pl.Int32,
+    "x":            pl.Int16,
+    "y":            pl.Int16,
+    "agent":        pl.Enum(AGENT_KINDS),   # Dictionary encoded, the same dictionary in every file
+    "age":          pl.Int32,
+    "max_lifespan": pl.Int32,
+    "energy":       pl.Int32,
+    "reproduce":    pl.Int8,
+    "eat":          pl.Int8,
+}
+
+# Agents that only get a row when their state changes (see SnapshotSink)
+STATIC_KINDS = ["grass", "dead_grass"]
+
+
+#######################################
+###          Delta Encoding         ###
+#######################################
+
+# Snapshot files only hold what can't be predicted. Between two rows of an agent these fields change
+# by a fixed amount per frame (static agents don't age or use energy), a value is only written where
+# an agent's field differs from what its previous row predicts. Its kind is only written when it changes.
+FIELD_RATES = {"max_lifespan": 0, "age": 1, "energy": -1}
+
+# Flags that are 0 unless something happened in that frame, only the events are written
+EVENT_FIELDS = ["reproduce", "eat"]
+
+def _rate(name: str) -> pl.Expr:
+    return pl.when(pl.col("agent").is_in(STATIC_KINDS)).then(0).otherwise(FIELD_RATES[name])
+
+def _anchor(name: str) -> pl.Expr:
+    # The value a field would have had at frame 0, the same on every row its prediction holds for
+    return pl.col(name) - _rate(name) * pl.col("frame")
+
+def delta_encode(rows: pl.DataFrame) -> pl.DataFrame:
+    # Null out every field that follows from the agent's previous row. Rows are in the order they were
+    # recorded, so the window over an agent's rows runs forward in time. The first row of every agent
+    # is written in full, a part file can be read without the ones before it.
+    predicted = lambda value: (value == value.shift(1).over("id")).fill_null(False)
+    return rows.with_columns(
+        *(pl.when(predicted(_anchor(name))).then(None).otherwise(pl.col(name)).alias(name) for name in FIELD_RATES),
+        *(pl.when(pl.col(name) != 0).then(pl.col(name)).alias(name) for name in EVENT_FIELDS),
+    ).with_columns(
+        agent=pl.when(predicted(pl.col("agent"))).then(None).otherwise(pl.col("agent")),
+    )
+
+def delta_decode(rows: pl.LazyFrame) -> pl.LazyFrame:
+    # Every row in full again, computed lazily: only the columns a query selects are rebuilt.
+    # Files written in full before delta encoding come back unchanged.
+    rows = rows.with_columns(pl.col("agent").forward_fill().over("id"))
+    return rows.with_columns(
+        *((_anchor(name).forward_fill().over("id") + _rate(name) * pl.col("frame")).alias(name) for name in FIELD_RATES),
+        *(pl.col(name).fill_null(0) for name in EVENT_FIELDS),
+    ).cast(SNAPSHOT_SCHEMA)
+
+
+class Recorded:
+    # Mixin for agents whose data goes to a recorder instead of Violet's in-memory snapshots.
+    # Violet would otherwise keep frame, id, x, y and image_index of every agent for every tick in RAM.
+
+    def _collect_replay_data(self):
+        pass
+
+
+#######################################
+###          Snapshot Sink          ###
+#######################################
+
+class SnapshotSink:
+    # Streams snapshot rows to Parquet files on disk while the simulation runs.
+    # Rows are buffered per column and written as one part file every `chunk_frames` frames,
+    # so memory only ever holds a single chunk. Read a run back with `scan_snapshots`.
+    # Moving agents get a row every frame, static agents (grass) only when their state changes:
+    # a grass patch keeps the state of its latest row until its next one.
+    # Fields are delta encoded per part file (see delta_encode), x and y are written for every row.
+
+    def __init__(self, path: str, chunk_frames: int = 600):
+        os.makedirs(path, exist_ok=True)
+        self.path         = path
+        self.chunk_frames = chunk_frames
+        self.parts        = 0
+        self.first_frame  = None
+        self.last_frame   = None
+        self.stop_frame   = None
+        self.stop_reason  = "duration"
+        self._columns     = {name: [] for name in SNAPSHOT_SCHEMA}
+        self._batches     = []
+
+    def record(self, agent, kind: str, age=0, max_lifespan=0, energy=0, reproduce=0, eat=0):
+        # One snapshot row for an agent, replacing its six save_data calls
+        columns = self._columns
+        columns["frame"].append(agent.shared.counter)
+        columns["id"].append(agent.id)
+        columns["x"].append(round(agent.pos.x))
+        columns["y"].append(round(agent.pos.y))
+        columns["agent"].append(kind)
+        columns["age"].append(age)
+        columns["max_lifespan"].append(max_lifespan)
+        columns["energy"].append(energy)
+        columns["reproduce"].append(reproduce)
+        columns["eat"].append(eat)
+
+    def record_many(self, **columns):
+        # A batch of rows given as whole NumPy columns (used by the vectorised engine)
+        self._batches.append(columns)
+
+    def record_change(self, agent, kind: str, previous: str = None, **fields):
+        # A static agent changed from `previous` (None when it is new) to `kind`
+        self.record(agent, kind, **fields)
+
+    def record_changes(self, previous, **columns):
+        self.record_many(**columns)
+
+    def end_frame(self, frame: int):
+        # Called once per tick; writes a part file when a chunk is complete
+        self.last_frame = frame
+        if self.first_frame is None:
+            self.first_frame = frame
+        if frame - self.first_frame + 1 >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        self.first_frame = None
+        frames = []
+        if self._columns["frame"]:
+            frames.append(pl.DataFrame(self._columns, schema=SNAPSHOT_SCHEMA))
+        if self._batches:
+            columns = {name: np.concatenate([batch[name] for batch in self._batches]) for name in SNAPSHOT_SCHEMA}
+            frames.append(pl.DataFrame(columns).cast(SNAPSHOT_SCHEMA))
+        if not frames:
+            return
+
+        delta_encode(pl.concat(frames)).write_parquet(os.path.join(self.path, "part-%05d.parquet" % self.parts))
+        self.parts += 1
+        self._columns = {name: [] for name in SNAPSHOT_SCHEMA}
+        self._batches = []
+
+    def stopped(self, frame: int, reason: str):
+        # The run ended early at this frame
+        self.stop_frame  = frame
+        self.stop_reason = reason
+
+    def close(self) -> str:
+        self.flush()
+        # When and why the run ended, next to the part files
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump({"stop_frame": self.stop_frame if self.stop_frame is not None else self.last_frame,
+                       "stop_reason": self.stop_reason}, f)
+        return self.path
+
+    def __setstate__(self, state):
+        # Resuming from a checkpoint: part files written after the checkpoint are stale
+        self.__dict__.update(state)
+        part = self.parts
+        while os.path.exists(os.path.join(self.path, "part-%05d.parquet" % part)):
+            os.remove(os.path.join(self.path, "part-%05d.parquet" % part))
+            part += 1
+
+
+#######################################
+###         Count Recorder          ###
+#######################################
+
+# Kinds of agent that eat and reproduce, these get event counters in the counts table
+ANIMAL_KINDS = ["fox", "rabbit"]
+
+COUNTS_SCHEMA = {
+    "frame": pl.Int32,
+    **{kind: pl.Int32 for kind in AGENT_KINDS},
+    **{kind+"_eat": pl.Int32 for kind in ANIMAL_KINDS},
+    **{kind+"_reproduce": pl.Int32 for kind in ANIMAL_KINDS},
+}
+
+
+class CountRecorder:
+    # Aggregate-only recording: keeps running per-frame counters instead of per-agent rows.
+    # The result is a frames x species table with the population of every kind of agent
+    # and the summed eat/reproduce events of the foxes and rabbits.
+
+    def __init__(self):
+        self._rows       = []
+        self.stop_reason = "duration"
+        # Static agents that only report changes, they count every frame until they change again
+        self._standing   = dict.fromkeys(AGENT_KINDS, 0)
+        self._reset()
+
+    def _reset(self):
+        self._counts    = dict.fromkeys(AGENT_KINDS, 0)
+        self._eat       = dict.fromkeys(AGENT_KINDS, 0)
+        self._reproduce = dict.fromkeys(AGENT_KINDS, 0)
+
+    def record(self, agent, kind: str, age=0, max_lifespan=0, energy=0, reproduce=0, eat=0):
+        self._counts[kind]    += 1
+        self._eat[kind]       += eat
+        self._reproduce[kind] += reproduce
+
+    def record_many(self, agent, eat, reproduce, **columns):
+        for kind in np.unique(agent):
+            rows = agent == kind
+            self._counts[kind]    += int(rows.sum())
+            self._eat[kind]       += int(eat[rows].sum())
+            self._reproduce[kind] += int(reproduce[rows].sum())
+
+    def record_change(self, agent, kind: str, previous: str = None, **fields):
+        self._standing[kind] += 1
+        if previous is not None:
+            self._standing[previous] -= 1
+
+    def record_changes(self, previous, agent, **columns):
+        # previous holds "" for agents that are new
+        for kind, count in zip(*np.unique(agent, return_counts=True)):
+            self._standing[kind] += int(count)
+        for kind, count in zip(*np.unique(previous, return_counts=True)):
+            if kind:
+                self._standing[kind] -= int(count)
+
+    def end_frame(self, frame: int):
+        self._rows.append((
+            frame,
+            *(self._counts[kind] + self._standing[kind] for kind in AGENT_KINDS),
+            *(self._eat[kind] for kind in ANIMAL_KINDS),
+            *(self._reproduce[kind] for kind in ANIMAL_KINDS),
+        ))
+        self._reset()
+
+    def stopped(self, frame: int, reason: str):
+        # The run ended early at this frame, which is the last row of the table
+        self.stop_reason = reason
+
+    def close(self) -> pl.DataFrame:
+        # stop_reason says why the table ends where it does: "duration" or the early stop condition
+        counts = pl.DataFrame(self._rows, schema=COUNTS_SCHEMA, orient="row")
+        return counts.with_columns(stop_reason=pl.lit(self.stop_reason))
+
+
+def make_recorder(recording: str, path: str):
+    # "snapshots" streams every agent row to disk, "counts" only keeps per-frame counters
+    if recording == "snapshots":
+        return SnapshotSink(path)
+    elif recording == "counts":
+        return CountRecorder()
+    else:
+        raise ValueError("Unknown recording mode: "+recording)
+
+
+def scan_snapshots(path: str) -> pl.LazyFrame:
+    # Lazily read all part files of a run written by SnapshotSink, with every row in full
+    return delta_decode(pl.scan_parquet(os.path.join(path, "part-*.parquet")))
+
+def population_counts(snapshots: pl.LazyFrame) -> pl.DataFrame:
+    # The counts table of a run recorded as snapshots, in the layout CountRecorder returns.
+    # One group_by on (frame, agent) pivoted to a column per kind. A static agent's row adds one
+    # to its new kind and takes one off the kind it had before, summed up over the frames.
+    rows = snapshots.select("frame", "id", pl.col("agent").cast(pl.String), "eat", "reproduce")
+    static = rows.filter(pl.col("agent").is_in(STATIC_KINDS)).sort("id", "frame", maintain_order=True)
+    left = (static.with_columns(agent=pl.col("agent").shift(1).over("id"))
+                  .filter(pl.col("agent").is_not_null())
+                  .with_columns(weight=pl.lit(-1)))
+    events = pl.concat([rows.with_columns(weight=pl.lit(1)), left.select(rows.collect_schema().names() + ["weight"])])
+
+    per_kind = (events.group_by("frame", "agent")
+                      .agg(count=pl.col("weight").sum(), eat=pl.col("eat").cast(pl.Int32).sum(),
+                           reproduce=pl.col("reproduce").cast(pl.Int32).sum())
+                      .collect()
+                      .pivot(on="agent", index="frame", values=["count", "eat", "reproduce"]))
+
+    # Frames without any row (e.g. after an extinction) still belong in the table
+    frames = pl.DataFrame({"frame": pl.int_range(per_kind["frame"].min(), per_kind["frame"].max() + 1, eager=True)})
+    counts = frames.join(per_kind, on="frame", how="left").sort("frame")
+    column = lambda name: pl.col(name) if name in counts.columns else pl.lit(0)
+    return counts.select(
+        "frame",
+        *(column("count_"+kind).fill_null(0).cum_sum().alias(kind) if kind in STATIC_KINDS
+          else column("count_"+kind).fill_null(0).alias(kind) for kind in AGENT_KINDS),
+        *(column("eat_"+kind).fill_null(0).alias(kind+"_eat") for kind in ANIMAL_KINDS),
+        *(column("reproduce_"+kind).fill_null(0).alias(kind+"_reproduce") for kind in ANIMAL_KINDS),
+    ).cast(COUNTS_SCHEMA)
@@ -0,0 +1,194 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+import polars as pl
+from result_cache import model_source
+
+
+# Populations that get a curve, an extinction probability and an oscillation period
+SPECIES = ["fox", "rabbit", "grass"]
+ANIMALS = ["fox", "rabbit"]
+
+# z value of a two-sided 95% confidence interval
+Z95 = 1.96
+
+
+#######################################
+###         Parameter Points        ###
+#######################################
+
+def point_key(config: dict) -> str:
+    # Short name of a parameter point: a config without its seed
+    values = {name: value for name, value in config.items() if name != "seed"}
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+def cached_points(cache_root: str = "cache") -> dict:
+    # Runs in the result cache grouped by parameter point: point -> (config without seed, [(seed, parquet path)]).
+    # Only the JSON files next to the results are read here, never the results themselves.
+    # Results of an older version of a model (another source hash) have the same config and seed as the
+    # current ones and are left out, as are results whose JSON predates the source hash. Should a seed of
+    # a point still show up twice, the most recent result is taken.
+    sources = {}
+    points = {}
+    for meta in sorted(glob.glob(os.path.join(cache_root, "*.json"))):
+        path = meta[:-len(".json")] + ".parquet"
+        try:
+            with open(meta) as f:
+                entry = json.load(f)
+            written = os.path.getmtime(path)
+        except FileNotFoundError:
+            continue
+        if "source" not in entry:
+            continue
+        model = entry["model"]
+        if model not in sources:
+            sources[model] = model_source(model)
+        if entry["source"] != sources[model]:
+            continue
+        config = entry["config"]
+        point = point_key(config)
+        if point not in points:
+            points[point] = ({name: value for name, value in config.items() if name != "seed"}, {})
+        seeds = points[point][1]
+        seed = config.get("seed")
+        if seed not in seeds or seeds[seed][0] < written:
+            seeds[seed] = (written, path)
+    return {point: (config, [(seed, path) for seed, (_, path) in seeds.items()]) for point, (config, seeds) in points.items()}
+
+def flat_config(config: dict, prefix: str = "") -> dict:
+    # Nested config values (e.g. the window) as columns of their own, window_width etc.
+    values = {}
+    for name, value in config.items():
+        if isinstance(value, dict):
+            values.update(flat_config(value, prefix+name+"_"))
+        else:
+            values[prefix+name] = value
+    return values
+
+
+#######################################
+###            Statistics           ###
+#######################################
+
+def scan_runs(runs) -> pl.LazyFrame:
+    # Population columns of every run of a point, tagged with the run's seed and why it ended
+    return pl.concat([pl.scan_parquet(path).select("frame", *SPECIES, "stop_reason").with_columns(seed=pl.lit(seed))
+                      for seed, path in runs])
+
+def died_out(kind: str) -> pl.Expr:
+    # Whether a run ended because this species (or both) died out
+    return pl.col("stop_reason").is_in([kind+"_extinction", "extinction"])
+
+def padded_runs(runs: pl.LazyFrame) -> pl.LazyFrame:
+    # Every run over all frames of the point. Runs that stopped early have no rows after their stop:
+    # a species that died out is 0 from there on, what the others would have done is unknown (null).
+    frames = runs.select(pl.int_range(pl.col("frame").min(), pl.col("frame").max() + 1, dtype=pl.Int32).alias("frame"))
+    reasons = runs.group_by("seed").agg(pl.col("stop_reason").last())
+    grid = reasons.join(frames, how="cross")
+    return grid.join(runs.drop("stop_reason"), on=["seed", "frame"], how="left").with_columns(
+        *(pl.when(pl.col(kind).is_null() & died_out(kind)).then(0).otherwise(pl.col(kind)).alias(kind) for kind in ANIMALS)
+    )
+
+def population_curves(runs: pl.LazyFrame) -> pl.DataFrame:
+    # Mean and 95% confidence interval of every population per frame across the seeds.
+    # After a run stopped early it counts as 0 for the species that died out and not at all for the others.
+    stats = []
+    for kind in SPECIES:
+        stats += [pl.col(kind).mean().alias(kind+"_mean"), pl.col(kind).std().alias(kind+"_std"),
+                  pl.col(kind).count().alias(kind+"_runs")]
+    curves = padded_runs(runs).group_by("frame").agg(pl.len().alias("runs"), *stats).sort("frame")
+    return curves.with_columns(
+        *((Z95 * pl.col(kind+"_std") / pl.col(kind+"_runs").sqrt()).fill_null(0).alias(kind+"_ci") for kind in SPECIES)
+    ).drop(*(kind+"_std" for kind in SPECIES), *(kind+"_runs" for kind in SPECIES)).collect()
+
+def oscillation_period(series: np.ndarray) -> float:
+    # Period in frames of the strongest frequency in the population, NaN when the series doesn't
+    # hold two full cycles of anything (too short, flat, or only a trend)
+    series = series[:np.flatnonzero(series)[-1] + 1] if series.any() else series
+    if len(series) < 8:
+        return float("nan")
+    frames = np.arange(len(series))
+    series = series - np.polyval(np.polyfit(frames, series, 1), frames)
+    # Swings past a band around the trend line, a population wobbling by an animal or so stays inside it.
+    # Two full cycles are four half cycles, so they swing from one side to the other at least three times.
+    band = max(series.std() / 2, 1)
+    sides = np.sign(series[np.abs(series) > band])
+    if np.count_nonzero(sides[1:] != sides[:-1]) < 3:
+        return float("nan")
+    spectrum = np.abs(np.fft.rfft(series))
+    frequencies = np.fft.rfftfreq(len(series))
+    # Bin 0 is the mean and bin 1 a single cycle over the whole run, where what is left of a trend ends up
+    strongest = spectrum[2:].argmax() + 2
+    return float(1 / frequencies[strongest])
+
+def run_statistics(runs: pl.LazyFrame) -> dict:
+    # Extinction probability and mean oscillation period of the foxes and rabbits across the seeds.
+    # A species died out in a run that stopped for it, or that went on with the species at 0.
+    per_run = runs.group_by("seed").agg(
+        *(pl.col(kind).sort_by("frame") for kind in ANIMALS),
+        *((died_out(kind).any() | (pl.col(kind).min() == 0)).alias(kind+"_died_out") for kind in ANIMALS),
+    ).collect()
+    stats = {"runs": per_run.height}
+    for kind in ANIMALS:
+        stats[kind+"_extinction"] = float(per_run[kind+"_died_out"].mean())
+        periods = [period for period in (oscillation_period(np.asarray(values)) for values in per_run[kind].to_list())
+                   if not np.isnan(period)]
+        stats[kind+"_period"] = float(np.mean(periods)) if periods else float("nan")
+    return stats
+
+
+#######################################
+###             Reports             ###
+#######################################
+
+def plot_curves(curves: pl.DataFrame, path: str, title: str):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    for kind, label in zip(SPECIES, ["Foxes", "Rabbits", "Grass"]):
+        mean, ci = curves[kind+"_mean"].to_numpy(), curves[kind+"_ci"].to_numpy()
+        ax.plot(curves["frame"], mean, label=label, linewidth=2)
+        ax.fill_between(curves["frame"], mean - ci, mean + ci, alpha=0.3)
+    ax.set_xlabel("frame")
+    ax.set_ylabel("population (mean, 95% CI)")
+    ax.set_title(title)
+    ax.legend()
+    fig.savefig(path)
+    plt.close(fig)
+
+def write_reports(cache_root: str = "cache", out_dir: str = "reports", plots: bool = True) -> pl.DataFrame:
+    # One curve table (and plot) per parameter point and one summary table over all points.
+    # Points are handled one at a time, so only the runs of a single point are ever in memory.
+    os.makedirs(out_dir, exist_ok=True)
+    summary = []
+    for point, (config, runs) in cached_points(cache_root).items():
+        scan = scan_runs(runs)
+        curves = population_curves(scan)
+        curves.write_parquet(os.path.join(out_dir, "point_"+point+".parquet"))
+        if plots:
+            plot_curves(curves, os.path.join(out_dir, "point_"+point+".jpg"),
+                        "%d seeds, point %s" % (len(runs), point))
+        with open(os.path.join(out_dir, "point_"+point+".json"), "w") as f:
+            json.dump(config, f, sort_keys=True, indent=2, default=str)
+        summary.append({"point": point, **run_statistics(scan), **flat_config(config)})
+
+    table = pl.DataFrame(summary, infer_schema_length=None)
+    table.write_csv(os.path.join(out_dir, "summary.csv"))
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate the cached runs of every parameter point over their seeds")
+    parser.add_argument("--cache", default="cache", help="result cache directory")
+    parser.add_argument("--out", default="reports", help="directory for the summary and the per point curves")
+    parser.add_argument("--no-plots", action="store_true")
+    args = parser.parse_args()
+
+    table = write_reports(args.cache, args.out, plots=not args.no_plots)
+    print(table.select("point", "runs", "fox_extinction", "rabbit_extinction", "fox_period", "rabbit_period"))
+    print("Reports written to "+args.out)
@@ -0,0 +1,121 @@
+import dataclasses
+import hashlib
+import json
+import os
+import sys
+import types
+import polars as pl
+from parameters import ALL_PARAMETERS, MODEL_PARAMETERS, model_module
+
+
+#######################################
+###            Cache Keys           ###
+#######################################
+
+def source_hash(module) -> str:
+    # Hash of the model's source code and of every module from this repository it uses,
+    # so editing the model (or e.g. the scent field) invalidates the cached results
+    root = os.path.dirname(os.path.abspath(module.__file__))
+    files = {os.path.abspath(module.__file__)}
+    for value in vars(module).values():
+        used = value if isinstance(value, types.ModuleType) else sys.modules.get(getattr(value, "__module__", None) or "")
+        path = getattr(used, "__file__", None)
+        if path and os.path.dirname(os.path.abspath(path)) == root:
+            files.add(os.path.abspath(path))
+
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def config_dict(config) -> dict:
+    # Serialized config without the id, which only numbers the configs of a matrix,
+    # and without the parameters its model doesn't read (e.g. the scent of a base model run)
+    values = dataclasses.asdict(config)
+    values.pop("id", None)
+    model = values.get("model")
+    if model in MODEL_PARAMETERS:
+        for name in set(ALL_PARAMETERS) - set(MODEL_PARAMETERS[model]):
+            values.pop(name, None)
+    return values
+
+def config_key(config, module, recording: str = "counts") -> str:
+    # Stable content address of a simulation result
+    payload = {
+        "model": module.__name__,
+        "source": source_hash(module),
+        "recording": recording,
+        "config": config_dict(config),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def model_source(model: str) -> str:
+    # Source hash of a model as it is now, the one the keys of its new results are made with
+    return source_hash(model_module(model))
+
+
+#######################################
+###           Result Cache          ###
+#######################################
+
+class ResultCache:
+    # Persistent on-disk cache of count tables, one Parquet file per result.
+    # A JSON file next to every result holds its key, the model's source hash and the config,
+    # so a result made by an older version of the model can be told apart from the current one.
+    # Least recently used results are evicted when the cache grows beyond max_bytes.
+
+    def __init__(self, root: str = "cache", max_bytes: int = 2 * 1024 ** 3):
+        os.makedirs(root, exist_ok=True)
+        self.root      = root
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key + ".parquet")
+
+    def get(self, key: str):
+        path = self.path(key)
+        # Touch the file so the modification time tracks the last use.
+        # Another process sharing the cache may evict it at any moment, which counts as a miss.
+        try:
+            os.utime(path)
+            return pl.read_parquet(path)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, df: pl.DataFrame, config=None):
+        path = self.path(key)
+        # Write to a temporary file first so readers never see half a result.
+        # The temporary name is unique per process, several workers may share the cache.
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        df.write_parquet(tmp)
+        os.replace(tmp, path)
+        if config is not None:
+            meta = {"key": key, "model": config.model, "source": model_source(config.model), "config": config_dict(config)}
+            with open(os.path.join(self.root, key + ".json"), "w") as f:
+                json.dump(meta, f, sort_keys=True, default=str)
+        self.evict()
+
+    def evict(self):
+        # Delete least recently used results until the cache fits in max_bytes.
+        # Other processes may be evicting at the same time, files that are already gone are skipped.
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".parquet"):
+                path = os.path.join(self.root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for name in (path, path[:-len(".parquet")] + ".json"):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
+            total -= size
@@ -0,0 +1,56 @@
+import zlib
+import numpy as np
+
+
+#######################################
+###         Random Streams          ###
+#######################################
+
+def generator(seed, stream: str) -> np.random.Generator:
+    # Independent NumPy generator for one named stream of one simulation.
+    # The same (seed, stream) always gives the same numbers, whichever process runs it.
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng(np.random.SeedSequence([seed, zlib.crc32(stream.encode())]))
+
+
+class RandomStream:
+    # Per-simulation random numbers derived from config.seed, replacing the global `random` module.
+    # Numbers are pre-drawn in blocks, so the hot loops of the agents don't call the generator
+    # one scalar at a time. Batches for whole populations come from `generator` (see vector_engine.py).
+
+    def __init__(self, seed, stream: str = "model", block: int = 4096):
+        if seed is None:
+            # No seed given: draw one, so the run can still be reproduced from `self.seed`
+            seed = int(np.random.SeedSequence().generate_state(1)[0])
+        self.seed    = seed
+        self.block   = block
+        self._gen    = generator(seed, stream)
+        self._uniform, self._u = self._gen.random(block), 0
+        self._normal,  self._n = self._gen.standard_normal(block), 0
+
+    def random(self) -> float:
+        if self._u == len(self._uniform):
+            self._uniform, self._u = self._gen.random(self.block), 0
+        value = self._uniform[self._u]
+        self._u += 1
+        return float(value)
+
+    def gauss(self, mu: float, sigma: float) -> float:
+        if self._n == len(self._normal):
+            self._normal, self._n = self._gen.standard_normal(self.block), 0
+        value = self._normal[self._n]
+        self._n += 1
+        return mu + sigma * float(value)
+
+    def uniform(self, a: float, b: float) -> float:
+        return a + (b - a) * self.random()
+
+    def probability(self, threshold: float) -> bool:
+        # Same as vi.util.probability
+        return threshold > self.random()
+
+    def random_pos(self, area):
+        # Same as vi.util.random_pos. pygame is only imported here, the vector engine doesn't need it
+        from pygame.math import Vector2
+        return Vector2(self.uniform(area.left, area.right), self.uniform(area.top, area.bottom))
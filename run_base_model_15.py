@@ -1,112 +1,87 @@
-import math
-import random
-from multiprocessing import Pool
+import heapq
+import os
+import sys
 import pygame as pg
-import polars as pl
 from pygame.sprite import Group
-from vi import Agent, HeadlessSimulation, Simulation, util, Window
-from vi.config import Config, dataclass, deserialize, serialize
-
-#######################################
-###          Class Configs          ###
-#######################################
-
-@deserialize
-@dataclass
-class AllConfig(Config):
-
-        # Parameters of the foxes.
-        fox_energy:                 int = 10800       # When this runs out the fox dies. Eat to get more energy.
-        fox_hunger_threshold:       int = 360       # When energy below this, Fox is hungry and looks for food.
-        rabbit_nutrition:           int = 1800       # Eating 1 rabbit gives this much energy
-        fox_lifespan:               int = 10800  # Foxes die from old age at 3 minutes
-        hunt_movespeed:             int = 1.1           # movement speed of fox when tracking scent or chasing rabbit
-        fox_p_reproduce:            float = 0.2         # Probability of reproduction (create new fox)
-
-        # Parameters of the rabbits.
-        rabbit_energy:              int = 10800       # When this runs out the rabbit dies. Eat to get more energy.
-        rabbit_hunger_threshold:    int = 600       # When energy below this, Rabbit is hungry and looks for food.
-        grass_nutrition:            int = 300       # Eating 1 grass gives this much energy
-        rabbit_lifespan:            int = 10800  # Rabbits die from old age at 3 minutes
-        rabbit_p_reproduce:         float = 0.2         # Probability of reproduction
-
-        # Parameters of the grass.
-        grass_t_reproduce:          int = 180        # Time before grass is back for consumption again
-
-        window=Window(750, 750)
- 
-
+from vi import Agent, HeadlessSimulation
+from AllMatrixes import AllConfig, Params
+from spatial_index import NeighbourIndex
+from recorders import Recorded, make_recorder
+from headless import PointAgent, StaticAgent, ImagelessSimulation
+from agent_pool import AgentPool, Pooled
+from checkpoint import Checkpointer
+from rng import RandomStream
+from early_stop import EarlyStop
+from result_cache import config_key
+from profiler import Profiler
 
 #######################################
 ###             Classes             ###
 #######################################
 
 
-class Grass(Agent):
+class Grass(Recorded, StaticAgent, PointAgent, Agent):
     config: AllConfig
+    size = (8, 8)
+    # The model's own fields have fixed slots; Violet's fields stay in the instance dict
+    __slots__ = ("t_reproduce", "state", "regrow_at")
 
     def on_spawn(self):
 
         # If first tick of the simulation:
         if self.shared.counter == 0:
             # Grass is given a random position in the simulation
-            self.pos = util.random_pos(pg.rect.Rect(1, 1, 749, 749))
+            self.pos = self.shared.rng.random_pos(pg.rect.Rect(1, 1, 749, 749))
 
         _obstacles: Group
-        # init parameters
-        self.t_reproduce    = self.config.grass_t_reproduce + int(random.gauss(60, 20)) # Offset initial reproduction timers
+        # init parameters from the run's parameter record
+        params = self.shared.params
+        self.t_reproduce    = params.grass_t_reproduce + int(self.shared.rng.gauss(60, 20)) # Offset initial reproduction timers
         self.state          = 1                                                         # State 1 = Grass is available for consumption State 0 = Grass is not available for consumption
-        self.timer          = self.t_reproduce                                          # Timer which is initiated to keep track of time after being eaten
+        self.regrow_at      = -1                                                        # Frame at which eaten grass is available again
         
         # Freeze movement. Grass does not walk.
         self.freeze_movement()
 
+        # Grass only writes a row when its state changes, the recorder counts it as standing until then
+        self.shared.recorder.record_change(self, "grass")
+
     def eaten(self):
-        self.pos = util.random_pos(pg.rect.Rect(1, 1, 749, 749))                        # Change position randomly
+        self.pos = self.shared.rng.random_pos(pg.rect.Rect(1, 1, 749, 749))                        # Change position randomly
         self.change_image(1)                                                            # Change image to visually indicate unavailable grass
         self.state = 0                                                                  # Set state to 0
 
-    def update(self):
-
-        # set reproduce flag
-        reproduce = 0
-
-        if self.state == 0:         
-            self.timer -= 1                                                             # If eaten, count down timer per step
-            if self.timer == 0:
-                self.state = 1                                                          # With timer 0, set state to be alive again
-                self.change_image(0)                                                    # Change image to green
-                self.timer = self.t_reproduce                                           # Reinitialize timer
-                
-
-        if self.state == 1:
-            self.save_data("agent", "grass")
-        else:
-            self.save_data("agent", "dead_grass")
+        # Schedule the regrowth instead of counting down a timer every tick
+        self.regrow_at = self.shared.counter + self.t_reproduce
+        heapq.heappush(self.shared.regrowth, (self.regrow_at, self.id, self))
+        self.shared.recorder.record_change(self, "dead_grass", previous="grass")
 
-        self.save_data("age", 0)
-        self.save_data("max_lifespan", 0)
-        self.save_data("energy", 0)
-        self.save_data("reproduce", reproduce)
-        self.save_data("eat", 0)
+    def regrow(self):
+        self.state = 1                                                                  # Set state to be alive again
+        self.change_image(0)                                                            # Change image to green
+        self.shared.recorder.record_change(self, "grass", previous="dead_grass")
 
-class Fox(Agent):
+class Fox(Recorded, Pooled, PointAgent, Agent):
     config: AllConfig
+    size = (20, 20)
+    __slots__ = ("energy", "nutrition", "hunger", "max_energy", "lifespan", "p_reproduce", "hunt_movespeed", "age", "track", "chase", "eat")
 
     def on_spawn(self):
 
         _obstacles: Group
 
         # Gaussian noise used for some parameters
-        noise = abs(random.gauss(1, 0.25))
-
-        # init parameters
-        self.energy         = self.config.fox_hunger_threshold
-        self.nutrition      = self.config.rabbit_nutrition
-        self.hunger         = self.config.fox_hunger_threshold
-        self.lifespan       = int(self.config.fox_lifespan * noise) # lifespans are randomised a bit
-        self.p_reproduce    = self.config.fox_p_reproduce
-        self.hunt_movespeed = self.config.hunt_movespeed
+        noise = abs(self.shared.rng.gauss(1, 0.25))
+
+        # init parameters from the run's parameter record
+        params = self.shared.params
+        self.energy         = params.fox_hunger_threshold
+        self.nutrition      = params.rabbit_nutrition
+        self.hunger         = params.fox_hunger_threshold
+        self.max_energy     = params.fox_energy
+        self.lifespan       = int(params.fox_lifespan * noise) # lifespans are randomised a bit
+        self.p_reproduce    = params.fox_p_reproduce
+        self.hunt_movespeed = params.hunt_movespeed
         self.age            = 0
 
     def update(self):
@@ -122,37 +97,22 @@ class Fox(Agent):
             self.kill()
 
         # Check for other foxes nearby
-        fox = (
-             self.in_proximity_accuracy()
-             .without_distance()
-             .filter_kind(Fox)
-             .first()
-         )
-        
+        fox = self.shared.index.neighbours(self).first(Fox)
+
         if self.energy > self.hunger and fox is not None:
-                if util.probability(self.p_reproduce):
+                if self.shared.rng.probability(self.p_reproduce):
                     self.reproduce()
-                    fox.energy = self.config.fox_hunger_threshold-1
-                    self.energy = self.config.fox_hunger_threshold-1
+                    fox.energy = self.hunger-1
+                    self.energy = self.hunger-1
                     reproduce = 1
 
-        # Save data to the dataframe
-        self.save_data("agent", 'fox')
-        self.save_data("age", self.age)
-        self.save_data("max_lifespan", self.lifespan)
-        self.save_data("energy", self.energy)
-        self.save_data("reproduce", reproduce)
-        self.save_data("eat", self.eat)
+        # Save data to the snapshot recorder
+        self.shared.recorder.record(self, "fox", self.age, self.lifespan, self.energy, reproduce, self.eat)
 
     def change_position(self):
         
         # Check for rabbits nearby
-        rabbit = (
-             self.in_proximity_accuracy()
-             .without_distance()
-             .filter_kind(Rabbit)
-             .first()
-         )
+        rabbit = self.shared.index.neighbours(self).first(Rabbit)
 
         # Set flags to 0 (used in saving data from simulation)
         self.track, self.chase, self.eat = 0, 0, 0
@@ -163,8 +123,8 @@ class Fox(Agent):
             if self.pos.distance_to(rabbit.pos) < 20:
                 rabbit.kill()
                 self.energy += self.nutrition
-                if self.energy > self.config.fox_energy:
-                    self.energy = self.config.fox_energy
+                if self.energy > self.max_energy:
+                    self.energy = self.max_energy
                 self.eat = 1 # set kill flag
 
             # Otherwise chase rabbit
@@ -188,8 +148,7 @@ class Fox(Agent):
                 self.move.rotate_ip(deg)
 
             # Obstacle Avoidance
-            obstacle_hit = pg.sprite.spritecollideany(self, self._obstacles, pg.sprite.collide_mask)  # type: ignore
-            collision = bool(obstacle_hit)
+            collision = self.hits_obstacle()
 
             # Reverse direction when colliding with an obstacle.
             if collision and not self._still_stuck:
@@ -215,19 +174,23 @@ class Fox(Agent):
         # Actually update the position at last.
         self.pos += self.move
 
-class Rabbit(Agent):
+class Rabbit(Recorded, Pooled, PointAgent, Agent):
     config: AllConfig
+    size = (20, 20)
+    __slots__ = ("energy", "hunger", "max_energy", "nutrition", "lifespan", "p_reproduce", "age")
 
     def on_spawn(self):
 
         # Gaussian noise used for some parameters
-        noise = abs(random.gauss(1, 0.25))
-        # init parameters
-        self.energy         = self.config.rabbit_hunger_threshold
-        self.hunger         = self.config.rabbit_hunger_threshold
-        self.nutrition      = self.config.grass_nutrition
-        self.lifespan       = int(self.config.rabbit_lifespan * noise)
-        self.p_reproduce    = self.config.rabbit_p_reproduce
+        noise = abs(self.shared.rng.gauss(1, 0.25))
+        # init parameters from the run's parameter record
+        params = self.shared.params
+        self.energy         = params.rabbit_hunger_threshold
+        self.hunger         = params.rabbit_hunger_threshold
+        self.max_energy     = params.rabbit_energy
+        self.nutrition      = params.grass_nutrition
+        self.lifespan       = int(params.rabbit_lifespan * noise)
+        self.p_reproduce    = params.rabbit_p_reproduce
         self.age            = 0
 
     def update(self):
@@ -243,66 +206,149 @@ class Rabbit(Agent):
         if self.age == self.lifespan or self.energy == 0:
             self.kill()
 
-        # Check for grass nearby
-        grass = (
-            self.in_proximity_accuracy()
-            .without_distance()
-            .filter_kind(Grass)
-            .filter(lambda agent: agent.state == 1)     #Filter only the grass that is alive
-            .first()
-        )
-
-        # Check for other rabbits nearby
-        rabbit = (
-            self.in_proximity_accuracy()
-            .without_distance()
-            .filter_kind(Rabbit)
-            .first()
-        )
+        # Check for grass and other rabbits nearby
+        neighbours = self.shared.index.neighbours(self)
+        grass  = neighbours.first(Grass, lambda agent: agent.state == 1)     #Filter only the grass that is alive
+        rabbit = neighbours.first(Rabbit)
 
         # If hungry and grass is nearby then eat grass
         if self.energy < self.hunger and grass is not None and grass.state == 1:
             grass.eaten()
             self.energy += self.nutrition
-            if self.energy > self.config.rabbit_energy:
-                self.energy = self.config.rabbit_energy
+            if self.energy > self.max_energy:
+                self.energy = self.max_energy
             eat = 1
         
         # If not hungry and other rabbits are nearby then attempt reproduction
         elif self.energy > self.hunger and rabbit is not None:
-                if util.probability(self.p_reproduce):
+                if self.shared.rng.probability(self.p_reproduce):
                     self.reproduce()
-                    rabbit.energy = self.config.rabbit_hunger_threshold-1
-                    self.energy = self.config.rabbit_hunger_threshold-1
+                    rabbit.energy = self.hunger-1
+                    self.energy = self.hunger-1
                     reproduce = 1
 
-        self.save_data("agent", 'rabbit')
-        self.save_data("age", self.age)
-        self.save_data("max_lifespan", self.lifespan)
-        self.save_data("energy", self.energy)
-        self.save_data("reproduce", reproduce)
-        self.save_data("eat", eat)
+        self.shared.recorder.record(self, "rabbit", self.age, self.lifespan, self.energy, reproduce, eat)
 
-class FoxRabbitHeadless(HeadlessSimulation):
+class FoxRabbitHeadless(ImagelessSimulation, HeadlessSimulation):
     config: AllConfig
+
+    def __init__(self, config: AllConfig, recorder):
+        super().__init__(config)
+        # Snapshot rows go straight to the recorder instead of Violet's in-memory metrics
+        self.shared.recorder = recorder
+        # Parameters of this model, read by the agents
+        self.shared.params = Params(config, "base")
+        # Dead foxes and rabbits are kept here and revived for births
+        self.shared.pool = AgentPool()
+        # Every random draw of the model comes from this per-simulation stream derived from config.seed
+        self.shared.rng = RandomStream(config.seed)
+        # Optional Checkpointer that saves the simulation state every N frames
+        self.checkpointer = None
+        # Stop conditions that can end the run before its duration
+        self.shared.early_stop = EarlyStop(config)
+        # Min-heap of (frame, id, grass) for eaten grass, ordered by the frame it grows back
+        self.shared.regrowth = []
+        # Neighbours are bucketed once per tick and shared by every call site
+        self.shared.index = NeighbourIndex(config.radius)
+
+    def before_update(self):
+        super().before_update()
+        # Agents that died last frame can be reused from now on
+        self.shared.pool.next_frame()
+        # Grass that is due grows back before any agent looks at it this frame
+        regrowth = self.shared.regrowth
+        while regrowth and regrowth[0][0] <= self.shared.counter:
+            heapq.heappop(regrowth)[2].regrow()
+        self.shared.index.rebuild(self.all_agents(), self.shared.counter)
+
+    def _HeadlessSimulation__update_positions(self):
+        # Violet's move phase (name mangled). Neighbours found while moving are stale once everyone moved
+        super()._HeadlessSimulation__update_positions()
+        self.shared.index.moved()
+
     def after_update(self):
-        ...
+        self.shared.recorder.end_frame(self.shared.counter)
+
+        if self.shared.early_stop.enabled:
+            foxes   = sum(1 for agent in self._agents if type(agent) is Fox)
+            rabbits = sum(1 for agent in self._agents if type(agent) is Rabbit)
+            reason  = self.shared.early_stop.after_frame(foxes, rabbits)
+            if reason is not None:
+                # Finish this frame and end the run, the recorder keeps when and why it stopped
+                self.shared.recorder.stopped(self.shared.counter, reason)
+                self.stop()
+                return
+
+        if self.checkpointer is not None:
+            self.checkpointer.after_tick(self)
 
 
 ########################################
 ###            Simulation            ###
 ########################################
 
-def run_simulation(config: AllConfig) -> pl.DataFrame:
-    df = (
-        FoxRabbitHeadless(config)
-        .batch_spawn_agents(20, Fox, images=["images/fox.png"])
-        .batch_spawn_agents(20, Rabbit, images=["images/rabbit.png", "images/white.png"])
-        .batch_spawn_agents(60, Grass, images=["images/green.png", "images/red.png"])
-        .run()
-        .snapshots
-    )
+def make_simulation(config: AllConfig, out_dir: str = "snapshots", recording: str = "snapshots",
+                    checkpoint_dir: str = None, checkpoint_every: int = 60 * 60,
+                    foxes: int = 20, rabbits: int = 20, grass: int = 60) -> FoxRabbitHeadless:
+    # A simulation that is ready to run: either freshly spawned with the given population,
+    # or restored from the latest checkpoint in checkpoint_dir.
+    recorder = make_recorder(recording, os.path.join(out_dir, "base_run_"+str(config.id)))
+    sim = FoxRabbitHeadless(config, recorder)
+
+    # Sprite images per agent class; the headless agents are points, so these files are never loaded
+    images = {
+        "Fox":    (Fox,    ["images/fox.png"]),
+        "Rabbit": (Rabbit, ["images/rabbit.png", "images/white.png"]),
+        "Grass":  (Grass,  ["images/green.png", "images/red.png"]),
+    }
+
+    state = None
+    if checkpoint_dir is not None:
+        key = config_key(config, sys.modules[__name__], recording+"/"+str((foxes, rabbits, grass)))
+        sim.checkpointer = Checkpointer(os.path.join(checkpoint_dir, key + ".ckpt"), checkpoint_every, ("recorder", "rng", "early_stop"))
+        state = sim.checkpointer.load()
+
+    if state is None:
+        (
+            sim
+            .batch_spawn_agents(foxes, Fox, images=images["Fox"][1])
+            .batch_spawn_agents(rabbits, Rabbit, images=images["Rabbit"][1])
+            .batch_spawn_agents(grass, Grass, images=images["Grass"][1])
+        )
+    else:
+        print("Resuming simulation ID "+str(config.id)+" from frame "+str(state["frame"]))
+        sim.checkpointer.restore(sim, state, images)
+        # The regrowth schedule refers to agents, so it is rebuilt from the restored grass
+        sim.shared.regrowth = [(agent.regrow_at, agent.id, agent) for agent in sim.all_agents() if type(agent) is Grass and agent.state == 0]
+        heapq.heapify(sim.shared.regrowth)
+
+    # Grass is only changed by the animals and the regrowth heap, Violet's move and update phases skip it
+    sim.set_aside_static()
+    return sim
+
+def run_simulation(config: AllConfig, out_dir: str = "snapshots", recording: str = "snapshots",
+                   checkpoint_dir: str = None, checkpoint_every: int = 60 * 60,
+                   foxes: int = 20, rabbits: int = 20, grass: int = 60, profile: bool = False):
+    # With recording="snapshots" every agent row is streamed to a directory of Parquet files and its path is returned.
+    # With recording="counts" only the per-frame population counts are kept and returned as a DataFrame.
+    # With a checkpoint_dir the state is saved every checkpoint_every frames and an interrupted run resumes from it.
+    # With profile=True the time spent per agent kind and phase is written to profile.json in the run directory.
+    sim = make_simulation(config, out_dir, recording, checkpoint_dir, checkpoint_every, foxes, rabbits, grass)
+
+    profiler = None
+    if profile:
+        profiler = Profiler()
+        profiler.attach(sim, [Fox, Rabbit, Grass])
+
+    sim.run()
+    result = sim.shared.recorder.close()
+    if profiler is not None:
+        profiler.detach()
+        profiler.save(os.path.join(out_dir, "base_run_"+str(config.id), "profile.json"))
+        profiler.print_summary()
+    if sim.checkpointer is not None:
+        sim.checkpointer.remove()
     print()
     print("Finished! Simulation ID "+str(config.id))
     print()
-    return df
\ No newline at end of file
+    return result
@@ -1,25 +1,99 @@
-import run_base_model_15
-import run_scent_model_15
 import AllMatrixes
-from multiprocessing import Pool
-import seaborn as sn
+from parameters import model_module
+from sweep import SweepExecutor, estimated_cost
+from result_cache import ResultCache, config_key
 import os
-import polars as pl
-import matplotlib.pyplot as plt
-
-def batch(iterable, n=1):
-    l = len(iterable)
-    for ndx in range(0, l, n):
-        yield iterable[ndx:min(ndx + n, l)]
+import time
+import multiprocessing as mp
+from recorders import population_counts, scan_snapshots
+import report
+import handoff
+
+# Plotting libraries (seaborn, matplotlib) and the work queue are imported where they are used,
+# so worker processes that import this module only load what the simulations need
+
+# Set to a SQLite file on a shared filesystem (e.g. "/shared/sweep.db") to spread the sweep over several machines.
+# The jobs are then published to that queue and run by "python work_queue.py worker --queue ..." on every node,
+# with --cache pointing at the same result cache as this script.
+QUEUE = None
+
+# Plots are rendered and written by this many processes next to the simulations,
+# so the driver never waits on matplotlib while results come in.
+# They are spawned rather than forked: polars hangs in a forked child once the parent has used it
+PLOT_PROCESSES = 2
+
+def run_job(job):
+    # Run one configuration in a worker and tag the result with its index,
+    # so results can be handled in whatever order they complete
+    # Long runs save a checkpoint every simulated hour, so an interrupted sweep picks up where it left off
+    # Every config runs with the model it names, so one sweep can mix models
+    # The table goes back as a handoff record (see handoff.py): the driver maps it instead of unpickling a copy
+    i, config, outbox = job
+    model = model_module(config.model)
+    counts = model.run_simulation(config, recording="counts", checkpoint_dir="checkpoints")
+    return i, handoff.export(counts, outbox, str(i))
+
+def save_result(name, config, counts):
+    # Runs in a plot worker. Workers don't have a display, so matplotlib renders off-screen
+    import matplotlib
+    matplotlib.use("Agg")
+    import seaborn as sn
+    import matplotlib.pyplot as plt
+
+    # A run recorded as snapshots is turned into the same frames x species table first,
+    # a result handed off by a sweep worker is mapped from its file
+    handed_off = counts if isinstance(counts, handoff.Handoff) else None
+    if isinstance(counts, str):
+        counts = population_counts(scan_snapshots(counts))
+    elif handed_off is not None:
+        counts = handed_off.load()
+
+    # Create plot
+    myPath = os.getcwd()
+    fig = plt.figure()
+    sn.lineplot(x=counts['frame'], y=counts['rabbit'], palette="tab10", legend='brief', label='Rabbits', linewidth=2)
+    sn.lineplot(x=counts['frame'], y=counts['fox'], palette="tab10", legend='brief', label='Foxes', linewidth=2)
+    sn.lineplot(x=counts['frame'], y=counts['grass'], palette="tab10", legend='brief', label='Grass', linewidth=2)
+
+    # Save plot to file
+    fig.savefig(myPath+'/'+config.model+'_plot_'+name+'.jpg')
+
+    # Close figure to save memory
+    plt.close(fig)
+
+    # Write configuration of the plot to a .txt file
+    with open(config.model+'_config_'+name+'.txt', 'w') as f:
+        f.write(str(config).replace(',','\n'))
+        f.close()
+
+    # This is the last use of a handed off result
+    if handed_off is not None:
+        del counts
+        handed_off.release()
+
+def progress(done, total, started):
+    # Print how many simulations are finished and an estimate of the remaining time
+    elapsed = time.time() - started
+    eta = elapsed / done * (total - done)
+    print('Progress: %d/%d simulations, elapsed %.0fs, ETA %.0fs' % (done, total, elapsed, eta))
 
 if __name__ == "__main__":
-    # We create a threadpool to run our simulations in parallel
-    with Pool(processes=5, maxtasksperchild=1) as p:
+    # We create a pool of worker processes, one per core by default, to run our simulations in parallel.
+    # Workers are reused between simulations and only restarted when their memory grows beyond max_rss_mb.
+    # Plots are handed to a separate, smaller pool of plot workers.
+    # Results come back through files in a handoff directory that is removed when the sweep ends
+    with SweepExecutor(run_job, max_rss_mb=1024) as sweep, mp.get_context("spawn").Pool(PLOT_PROCESSES) as plots, \
+            handoff.HandoffDir() as outbox:
+        plotted = []
         # The matrix will create unique configs
 
+        # model=["base", "scent"] runs both models over the same parameters, a model ignores the parameters it doesn't have.
+        # "vector_base" and "vector_scent" run them on the NumPy engine, several times faster
+
         # run twice: once with rabbit_nutrition=[30*60, 10*60], rabbit_hunger_threshold=[10*60, 6*60], rabbit_p_reproduce=[0.2, 0.3]
 
         matrix = AllMatrixes.AllMatrix(
+                        model=["scent"],
                         radius=[50],
                         seed=[1,2,3,4,5],
                         movement_speed=[1],
@@ -30,7 +104,7 @@ if __name__ == "__main__":
                         rabbit_nutrition        = [1800],
                         fox_lifespan            = [10800],
                         hunt_movespeed          = [1.1],
-                        track_movespeed         = [1.1],     # COMMENT OUT IF USING BASE_MODEL
+                        track_movespeed         = [1.1],     # scent model only
                         fox_p_reproduce         = [0.1],
 
                         rabbit_energy           = [10800],
@@ -41,8 +115,10 @@ if __name__ == "__main__":
 
                         grass_t_reproduce       = [180],
 
-                        scent                   = [120],     # COMMENT OUT IF USING BASE_MODEL
-                        scent_interval          = [30],      # COMMENT OUT IF USING BASE_MODEL
+                        scent                   = [120],     # scent model only
+                        scent_interval          = [30],      # scent model only
+
+                        stop_on_extinction      = [1],       # Runs end once the foxes or rabbits have died out
 
                                                    )
         # Create unique combinations of matrix values
@@ -50,46 +126,78 @@ if __name__ == "__main__":
         print()
         print("Number of configurations: ", len(configs))
         print()
-        # print("Number of batches: ", ((len(configs)-(len(configs)%10))/10))
-        # print()
         batch_count = 0
-        # for conf_batch in batch(configs, 10):
-        #     # Create a list of dataframes from each configuration
-        #     df_list = p.map(run_base_model_15.run_simulation, conf_batch)
-        
-        df_list = p.map(run_scent_model_15.run_simulation, configs)
-        # Iterate list of dataframes and create plots
-        for i, df in enumerate(df_list):
-
-            # Create plot
-            foxes = df[df['agent'] == 'fox']
-            foxes_count = foxes.groupby('frame', maintain_order=True).agg([pl.col('agent').count()])
-
-            rabbits = df[df['agent'] == 'rabbit']
-            rabbits_count = rabbits.groupby('frame', maintain_order=True).agg([pl.col('agent').count()])
-
-            grass = df[df['agent'] == 'grass']
-            grass_count = grass.groupby('frame', maintain_order=True).agg([pl.col('agent').count()])
-
-            myPath = os.getcwd()
-            fig = plt.figure()
-            sn.lineplot(x=rabbits_count['frame'], y=rabbits_count['agent'], palette="tab10", legend='brief', label='Rabbits', linewidth=2)
-            sn.lineplot(x=foxes_count['frame'], y=foxes_count['agent'], palette="tab10", legend='brief', label='Foxes', linewidth=2)
-            sn.lineplot(x=grass_count['frame'], y=grass_count['agent'], palette="tab10", legend='brief', label='Grass', linewidth=2)
-
-            # Save plot to file
-            fig.savefig(myPath+'/scent_plot_'+str(batch_count)+str(i)+'.jpg')
-
-            # Close figure to save memory
-            plt.close(fig)
-
-            # Write configuration of the plot to a .txt file
-            with open('scent_config_'+str(batch_count)+str(i)+'.txt', 'w') as f:
-                f.write(str(configs[i]).replace(',','\n'))
-                f.close()
-        
+
+        # Results are cached on disk by config and model source,
+        # so configurations that were simulated before are loaded instead of re-run
+        cache = ResultCache()
+        keys = [config_key(config, model_module(config.model)) for config in configs]
+        jobs = []
+        seen = set()
+        for i, config in enumerate(configs):
+            # Configs that only differ in parameters their model ignores (e.g. the scent of a base model run)
+            # are the same run, it is simulated and plotted once
+            if keys[i] in seen:
+                continue
+            seen.add(keys[i])
+            counts = cache.get(keys[i])
+            if counts is None:
+                jobs.append((i, config, outbox.path))
+            else:
+                plotted.append(plots.apply_async(save_result, (str(batch_count)+str(i), config, counts)))
+        print("Loaded from cache: ", len(seen) - len(jobs))
+        print("Same run as another config: ", len(configs) - len(seen))
+        print()
+
+        # Only the per-frame population counts are needed for the plots,
+        # so the simulations record counts instead of per-agent snapshots.
+        # Results are handled as soon as they complete and released right after,
+        # so the parent only ever holds one result at a time. A result is mapped from the worker's handoff file,
+        # written to the cache and then given to a plot worker as the same small handoff record.
+        # The longest simulations (duration x population caps) are started first.
+        started = time.time()
+        if QUEUE is None:
+            results = sweep.imap_unordered(jobs, cost=lambda job: estimated_cost(job[1]))
+            for done, (i, result) in enumerate(results, start=1):
+                counts = result.load()
+                cache.put(keys[i], counts, configs[i])
+                del counts
+                plotted.append(plots.apply_async(save_result, (str(batch_count)+str(i), configs[i], result)))
+                progress(done, len(jobs), started)
+        else:
+            # The workers put their results in the shared cache, we pick them up from there
+            from work_queue import WorkQueue
+            queue = WorkQueue(QUEUE)
+            queue.publish([config for _, config, _ in jobs], cache)
+            index = {keys[i]: i for i, _, _ in jobs}
+            waiting, done = set(index), 0
+            while waiting:
+                evicted = set()
+                for key in queue.wait(waiting):
+                    i = index[key]
+                    counts = cache.get(key)
+                    if counts is None:
+                        # Evicted from the cache between the worker writing it and us reading it
+                        print("Result of config "+str(i)+" is gone from the cache, running it again")
+                        evicted.add(key)
+                        continue
+                    plotted.append(plots.apply_async(save_result, (str(batch_count)+str(i), configs[i], counts)))
+                    del counts
+                    done += 1
+                    progress(done, len(jobs), started)
+                if evicted:
+                    queue.publish([configs[index[key]] for key in evicted], cache)
+                waiting = evicted
+
+        # Wait for the last plots, raising any error a plot worker ran into
+        for plot in plotted:
+            plot.get()
         print('Done: Batch '+str(batch_count))
         batch_count += 1
 
+        # Mean curves, extinction probabilities and periods over the seeds of every parameter point in the cache
+        report.write_reports(cache.root, "reports")
+        print('Reports written to reports/')
+
         print('Done!')
 
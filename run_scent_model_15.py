@@ -1,114 +1,90 @@
-import random
-from multiprocessing import Pool
-import polars as pl
+import heapq
+import os
+import sys
 import pygame as pg
 from pygame.sprite import Group
-from vi import Agent, HeadlessSimulation, Simulation, util, Window
-from vi.config import Config, dataclass, deserialize
+from vi import Agent, HeadlessSimulation
+from AllMatrixes import AllConfig, Params
+from scent_field import ScentField
+from spatial_index import NeighbourIndex
+from recorders import Recorded, make_recorder
+from headless import PointAgent, StaticAgent, ImagelessSimulation
+from agent_pool import AgentPool, Pooled
+from checkpoint import Checkpointer
+from rng import RandomStream
+from early_stop import EarlyStop
+from result_cache import config_key
+from profiler import Profiler
 
 
-#######################################
-###          Class Configs          ###
-#######################################
-
-@deserialize
-@dataclass
-class AllConfig(Config):
-
-        # Parameters of the foxes
-        fox_energy:                 int = 10800     # When this runs out the fox dies. Eat to get more energy.
-        fox_hunger_threshold:       int = 480       # When energy below this, Fox is hungry and looks for food.
-        rabbit_nutrition:           int = 600       # Eating 1 rabbit gives this much energy
-        fox_lifespan:               int = 10800     # Foxes die from old age at 3 minutes
-        hunt_movespeed:             int = 1.1       # movement speed of fox when hunting rabbit
-        track_movespeed:            int = 1.5       # movement speed of fox when tracking rabbit
-        fox_p_reproduce:            float = 0.2     # Probability of reproduction (create new fox)
-
-        # Parameters of the rabbits
-        rabbit_energy:              int = 10800     # When this runs out the rabbit dies. Eat to get more energy.
-        rabbit_hunger_threshold:    int = 600       # When energy below this, Rabbit is hungry and looks for food.
-        grass_nutrition:            int = 300       # Eating 1 grass gives this much energy
-        rabbit_lifespan:            int = 10800     # Rabbits die from old age at 3 minutes
-        rabbit_p_reproduce:         float = 0.2     # Probability of reproduction
-
-        # Parameters of the grass
-        grass_t_reproduce:          int = 180       # Delay between reproductions
-
-        # Parameters of the scent
-        scent:                      int = 120       # When this runs out the scent disappears
-        scent_interval:             int = 30        # How often rabbits drop a scent        
-
 #######################################
 ###             Classes             ###
 #######################################
 
 
-class Grass(Agent):
+class Grass(Recorded, StaticAgent, PointAgent, Agent):
     config: AllConfig
+    size = (8, 8)
+    # The model's own fields have fixed slots; Violet's fields stay in the instance dict
+    __slots__ = ("t_reproduce", "state", "regrow_at")
 
     def on_spawn(self):
 
         # If first tick of the simulation:
         if self.shared.counter == 0:
             # Grass is given a random position in the simulation
-            self.pos = util.random_pos(pg.rect.Rect(1, 1, 749, 749))
+            self.pos = self.shared.rng.random_pos(pg.rect.Rect(1, 1, 749, 749))
 
         _obstacles: Group
-        # init parameters
-        self.t_reproduce    = self.config.grass_t_reproduce + int(random.gauss(60, 20)) # Offset initial reproduction timers
+        # init parameters from the run's parameter record
+        params = self.shared.params
+        self.t_reproduce    = params.grass_t_reproduce + int(self.shared.rng.gauss(60, 20)) # Offset initial reproduction timers
         self.state          = 1                                                         # State 1 = Grass is available for consumption State 0 = Grass is not available for consumption
-        self.timer          = self.t_reproduce                                          # Timer which is initiated to keep track of time after being eaten
+        self.regrow_at      = -1                                                        # Frame at which eaten grass is available again
         
         # Freeze movement. Grass does not walk.
         self.freeze_movement()
 
+        # Grass only writes a row when its state changes, the recorder counts it as standing until then
+        self.shared.recorder.record_change(self, "grass")
+
     def eaten(self):
-        self.pos = util.random_pos(pg.rect.Rect(1, 1, 749, 749))                        # Change position randomly
+        self.pos = self.shared.rng.random_pos(pg.rect.Rect(1, 1, 749, 749))                        # Change position randomly
         self.change_image(1)                                                            # Change image to visually indicate unavailable grass
         self.state = 0                                                                  # Set state to 0
 
-    def update(self):
+        # Schedule the regrowth instead of counting down a timer every tick
+        self.regrow_at = self.shared.counter + self.t_reproduce
+        heapq.heappush(self.shared.regrowth, (self.regrow_at, self.id, self))
+        self.shared.recorder.record_change(self, "dead_grass", previous="grass")
 
-        # set reproduce flag
-        reproduce = 0
+    def regrow(self):
+        self.state = 1                                                                  # Set state to be alive again
+        self.change_image(0)                                                            # Change image to green
+        self.shared.recorder.record_change(self, "grass", previous="dead_grass")
 
-        if self.state == 0:         
-            self.timer -= 1                                                             # If eaten, count down timer per step
-            if self.timer == 0:
-                self.state = 1                                                          # With timer 0, set state to be alive again
-                self.change_image(0)                                                    # Change image to green
-                self.timer = self.t_reproduce                                           # Reinitialize timer
-                
-
-        if self.state == 1:
-            self.save_data("agent", "grass")
-        else:
-            self.save_data("agent", "dead_grass")
-
-        self.save_data("age", 0)
-        self.save_data("max_lifespan", 0)
-        self.save_data("energy", 0)
-        self.save_data("reproduce", reproduce)
-        self.save_data("eat", 0)
-
-class Fox(Agent):
+class Fox(Recorded, Pooled, PointAgent, Agent):
     config: AllConfig
+    size = (20, 20)
+    __slots__ = ("energy", "nutrition", "hunger", "max_energy", "lifespan", "p_reproduce", "hunt_movespeed", "track_movespeed", "age", "track", "chase", "eat")
 
     def on_spawn(self):
 
         _obstacles: Group
 
         # Gaussian noise used for some parameters
-        noise = abs(random.gauss(1, 0.25))
-
-        # init parameters
-        self.energy         = self.config.fox_hunger_threshold-1
-        self.nutrition      = self.config.rabbit_nutrition
-        self.hunger         = self.config.fox_hunger_threshold
-        self.lifespan       = int(self.config.fox_lifespan * noise) # lifespans are randomised a bit
-        self.p_reproduce    = self.config.fox_p_reproduce
-        self.hunt_movespeed = self.config.hunt_movespeed
-        self.track_movespeed = self.config.track_movespeed
+        noise = abs(self.shared.rng.gauss(1, 0.25))
+
+        # init parameters from the run's parameter record
+        params = self.shared.params
+        self.energy         = params.fox_hunger_threshold-1
+        self.nutrition      = params.rabbit_nutrition
+        self.hunger         = params.fox_hunger_threshold
+        self.max_energy     = params.fox_energy
+        self.lifespan       = int(params.fox_lifespan * noise) # lifespans are randomised a bit
+        self.p_reproduce    = params.fox_p_reproduce
+        self.hunt_movespeed = params.hunt_movespeed
+        self.track_movespeed = params.track_movespeed
         self.age            = 0
 
     def update(self):
@@ -124,48 +100,38 @@ class Fox(Agent):
             self.kill()
 
         # Check for other foxes nearby
-        fox = (
-             self.in_proximity_accuracy()
-             .without_distance()
-             .filter_kind(Fox)
-             .first()
-         )
-        
+        fox = self.shared.index.neighbours(self).first(Fox)
+
         if self.energy > self.hunger and fox is not None:
-                if util.probability(self.p_reproduce):
+                if self.shared.rng.probability(self.p_reproduce):
                     self.reproduce()
-                    fox.energy = self.config.fox_hunger_threshold-1
-                    self.energy = self.config.fox_hunger_threshold-1
+                    fox.energy = self.hunger-1
+                    self.energy = self.hunger-1
                     reproduce = 1
 
-        # Save data to the dataframe
-        self.save_data("agent", "fox")
-        self.save_data("age", self.age)
-        self.save_data("max_lifespan", self.lifespan)
-        self.save_data("energy", self.energy)
-        self.save_data("reproduce", reproduce)
-        self.save_data("eat", self.eat)
-
-    def closestRabbit(self):
-        # Get the rabbit closest to the fox
-
-        # Get list of rabbits in proximity
-        candidates = (
-                self.in_proximity_accuracy()
-                .without_distance()
-                .filter_kind(Rabbit)
-            )
-        # Pick first rabbit in list
-        closest = candidates.first()
-        if closest:
-            for i in candidates:
-                # Compare distance from fox with all other candidates
-                if i.state == 0 and (self.pos - i.pos).length() < (self.pos - closest.pos).length():
-                    closest = i
-            # Rabbit closest to fox is returned
-            return closest if closest.state == 0 else False
-        else:
-            return False
+        # Save data to the snapshot recorder
+        self.shared.recorder.record(self, "fox", self.age, self.lifespan, self.energy, reproduce, self.eat)
+
+    def sense(self, neighbours):
+        # Single pass over the fox's neighbours: the nearest living rabbit and its distance, or otherwise
+        # the aggregated scent vector (None when there is no scent around). The scent field is only
+        # sampled when no rabbit is in range, since the fox would ignore the scent anyway.
+        rabbit, dist = neighbours.nearest(Rabbit)
+        if rabbit is not None:
+            return rabbit, dist, None
+
+        scent_dx, scent_dy, scent_dist, scent_strength = neighbours.scent
+        if len(scent_dist) == 0:
+            return None, None, None
+
+        # All scents that are too close are ignored to avoid following too closely
+        far = scent_dist > 10
+        # Aggregation of scent vectors, favoring scents that are further away and stronger
+        weight = (scent_dist[far] ** 3) * (scent_strength[far].astype(float) ** 4) / 1200
+        scentVector = pg.Vector2(float((scent_dx[far] * weight).sum()), float((scent_dy[far] * weight).sum()))
+        if scentVector.length() > 0:
+            scentVector = scentVector.normalize()
+        return None, None, scentVector
         
     def oppositeVector(self,first,second):
         # Get opposite vector from the first to the second entity
@@ -178,17 +144,9 @@ class Fox(Agent):
     def change_position(self):
         
         self.there_is_no_escape()
-        # Check for rabbits nearby
-        rabbit_list = (
-            self.in_proximity_accuracy()
-                .without_distance()
-                .filter_kind(Rabbit)
-        )
-
-        rabbit = None
 
-        # Getting a list of the nearby scent entities
-        scent_list = [i for i in rabbit_list if i.state == 1]
+        # Neighbours where the fox is before moving; the index drops them once everyone moved, Fox.update looks again
+        neighbours = self.shared.index.neighbours(self)
 
         # Set flags to 0 (used in saving data from simulation)
         self.track = 0 
@@ -197,30 +155,22 @@ class Fox(Agent):
 
         # If there are rabbits in proximity when hungry:
         if self.energy < self.hunger:
-            rabbit = self.closestRabbit()
+            rabbit, dist, scentVector = self.sense(neighbours)
             # Eat rabbit if close
-            if rabbit:
+            if rabbit is not None:
                 # If a rabbit is close enough, the fox eats it and replenishes energy
-                if self.pos.distance_to(rabbit.pos) < 20:
+                if dist < 20:
                     rabbit.kill()
                     self.energy += self.nutrition
-                    if self.energy > self.config.fox_energy:
-                        self.energy = self.config.fox_energy
+                    if self.energy > self.max_energy:
+                        self.energy = self.max_energy
                     self.eat = 1  # set kill flag
                 # Otherwise chase rabbit by following its relative position vector
                 else:
                     self.move = self.gotoVector(self,rabbit).normalize() * self.hunt_movespeed
                     self.chase = 1  # set chase flag
             # If there exists nearby scentes, we should chase these scents with a heightened move speed
-            elif scent_list != []:
-                scentVector = pg.Vector2(0,0)
-                for scent in scent_list:
-                    # All scents that are too close are ignored to avoid following too closely
-                    if self.gotoVector(self,scent).length() > 10:
-                        # Aggregation of scent vectors, favoring scents that are further away and stronger
-                        scentVector += self.gotoVector(self,scent) * (self.gotoVector(self,scent).length()  ** 3) * (scent.scent ** 4) / 1200
-                if scentVector.length() > 0:
-                    scentVector = scentVector.normalize()
+            elif scentVector is not None:
                 # Only adjust the previous movement vector by a fraction of the new movement vector
                 # This mechanism is for momentum, creating smoother movement. Due to a typo the eventual
                 # momentum factor is in fact 0.83 (1 + 0.7*0.3 = 1.21 which gets normalized so 1 / 1.21 = 0.83)
@@ -262,170 +212,235 @@ class Fox(Agent):
         # Actually update the position at last.
         self.pos += self.move
 
-class Rabbit(Agent):
+class Rabbit(Recorded, Pooled, PointAgent, Agent):
     config: AllConfig
+    size = (20, 20)
+    __slots__ = ("energy", "hunger", "max_energy", "nutrition", "lifespan", "p_reproduce", "age", "scent_interval")
 
     def on_spawn(self):
 
         # Gaussian noise used for some parameters
-        noise = abs(random.gauss(1, 0.25))
-        # init parameters
-        self.energy         = self.config.rabbit_hunger_threshold-1
-        self.hunger         = self.config.rabbit_hunger_threshold
-        self.nutrition      = self.config.grass_nutrition
-        self.lifespan       = int(self.config.rabbit_lifespan * noise)
-        self.p_reproduce    = self.config.rabbit_p_reproduce
+        noise = abs(self.shared.rng.gauss(1, 0.25))
+        # init parameters from the run's parameter record
+        params = self.shared.params
+        self.energy         = params.rabbit_hunger_threshold-1
+        self.hunger         = params.rabbit_hunger_threshold
+        self.max_energy     = params.rabbit_energy
+        self.nutrition      = params.grass_nutrition
+        self.lifespan       = int(params.rabbit_lifespan * noise)
+        self.p_reproduce    = params.rabbit_p_reproduce
         self.age            = 0
-        self.state = 0  # 0 if rabbit, 1 if scent
-        self.scent = self.config.scent
-        self.scent_interval = self.config.scent_interval  # How often rabbits drop scent
-        self.scent_id = None  # ID of the agent the scent belongs to. None is agent is a rabbit.
+        self.scent_interval = params.scent_interval  # How often rabbits drop scent
+
+    def kill(self):
+        super().kill()
+        # Scent left behind by this rabbit disappears with it
+        self.shared.scent_field.drop_owner(self.id)
 
     def update(self):
 
-        # If agent is rabbit (not scent)
-        if self.state == 0:
-
-            # Update parameters
-            self.age     += 1  # Aging process.
-            self.energy  -= 1  # Metabolism process (spend energy)
-            
-            # Set flags for data collection
-            eat, reproduce = 0, 0
-
-            # Kill agent if too old or out of energy
-            if self.age == self.lifespan or self.energy == 0:
-                self.kill()
-
-            # Check for grass nearby
-            grass = (
-                self.in_proximity_accuracy()
-                .without_distance()
-                .filter_kind(Grass)
-                .first()
-            )
-
-            # Check for other rabbits nearby
-            rabbit = (
-                self.in_proximity_accuracy()
-                .without_distance()
-                .filter_kind(Rabbit)
-                .first()
-            )
-
-            # If hungry and grass is nearby then eat grass
-            if self.energy < self.hunger and grass is not None and grass.state == 1:
-                grass.eaten()
-                self.energy += self.nutrition
-                if self.energy > self.config.rabbit_energy:
-                    self.energy = self.config.rabbit_energy
-                eat = 1
-            
-            # If not hungry and other rabbits are nearby then attempt reproduction
-            elif self.energy > self.hunger and rabbit is not None:
-                if util.probability(self.p_reproduce):
-                    self.reproduce()
-                    rabbit.energy = self.config.rabbit_hunger_threshold-1
-                    self.energy = self.config.rabbit_hunger_threshold-1
-                    reproduce = 1
+        # Update parameters
+        self.age     += 1  # Aging process.
+        self.energy  -= 1  # Metabolism process (spend energy)
+        
+        # Set flags for data collection
+        eat, reproduce = 0, 0
+
+        # Kill agent if too old or out of energy
+        if self.age == self.lifespan or self.energy == 0:
+            self.kill()
 
-            # Spawn scent each scent_interval
-            if self.age % self.scent_interval == 0:
-                scent = self.reproduce()
-                scent.state = 1  # use this rabbit as scent
-                scent.scent_id = self
-
-            self.save_data("agent", "rabbit")
-            self.save_data("age", self.age)
-            self.save_data("max_lifespan", self.lifespan)
-            self.save_data("energy", self.energy)
-            self.save_data("reproduce", reproduce)
-            self.save_data("eat", eat)
-
-        # If agent is being used as scent
-        elif self.state == 1:
-
-            # If scent timer has run out, kill agent
-            if self.scent == 0:
-                self.kill()
-
-            if Agent.is_dead(self.scent_id):
-                self.kill()
-            
-            # Use scent image instead of rabbit image
-            self.change_image(1)
-
-            # Count down scent timer
-            self.scent -= 1
-
-            self.save_data("agent", "scent")
-            self.save_data("age", 0)
-            self.save_data("max_lifespan", 0)
-            self.save_data("energy", 0)
-            self.save_data("reproduce", 0)
-            self.save_data("eat", 0)
+        # Check for grass and other rabbits nearby
+        neighbours = self.shared.index.neighbours(self)
+        grass  = neighbours.first(Grass)
+        rabbit = neighbours.first(Rabbit)
+
+        # If hungry and grass is nearby then eat grass
+        if self.energy < self.hunger and grass is not None and grass.state == 1:
+            grass.eaten()
+            self.energy += self.nutrition
+            if self.energy > self.max_energy:
+                self.energy = self.max_energy
+            eat = 1
+        
+        # If not hungry and other rabbits are nearby then attempt reproduction
+        elif self.energy > self.hunger and rabbit is not None:
+            if self.shared.rng.probability(self.p_reproduce):
+                self.reproduce()
+                rabbit.energy = self.hunger-1
+                self.energy = self.hunger-1
+                reproduce = 1
+
+        # Drop scent into the scent field each scent_interval. A rabbit that died this tick has had its scent
+        # removed by kill() and must not leave a new one behind
+        if self.age % self.scent_interval == 0 and self.is_alive():
+            self.shared.scent_field.deposit(self.id, self.pos)
+
+        self.shared.recorder.record(self, "rabbit", self.age, self.lifespan, self.energy, reproduce, eat)
 
     def change_position(self):
 
-        if self.state == 0:
-            changed = self.there_is_no_escape()
+        changed = self.there_is_no_escape()
 
-            prng = self.shared.prng_move
+        prng = self.shared.prng_move
 
-            # Always calculate the random angle so a seed could be used.
-            deg = prng.uniform(-30, 30)
+        # Always calculate the random angle so a seed could be used.
+        deg = prng.uniform(-30, 30)
 
-            # Only update angle if the agent was teleported to a different area of the simulation.
-            if changed:
-                self.move.rotate_ip(deg)
+        # Only update angle if the agent was teleported to a different area of the simulation.
+        if changed:
+            self.move.rotate_ip(deg)
 
-            # Obstacle Avoidance
-            obstacle_hit = pg.sprite.spritecollideany(self, self._obstacles, pg.sprite.collide_mask)  # type: ignore
-            collision = bool(obstacle_hit)
+        # Obstacle Avoidance
+        collision = self.hits_obstacle()
 
-            # Reverse direction when colliding with an obstacle.
-            if collision and not self._still_stuck:
-                self.move.rotate_ip(180)
-                self._still_stuck = True
+        # Reverse direction when colliding with an obstacle.
+        if collision and not self._still_stuck:
+            self.move.rotate_ip(180)
+            self._still_stuck = True
 
-            if not collision:
-                self._still_stuck = False
+        if not collision:
+            self._still_stuck = False
 
-            # Random opportunity to slightly change angle.
-            # Probabilities are pre-computed so a seed could be used.
-            should_change_angle = prng.random()
-            deg = prng.uniform(-10, 10)
+        # Random opportunity to slightly change angle.
+        # Probabilities are pre-computed so a seed could be used.
+        should_change_angle = prng.random()
+        deg = prng.uniform(-10, 10)
 
-            # Only allow the angle opportunity to take place when no collisions have occured.
-            # This is done so an agent always turns 180 degrees. Any small change in the number of degrees
-            # allows the agent to possibly escape the obstacle.
-            if not collision and not self._still_stuck and 0.25 > should_change_angle:
-                self.move.rotate_ip(deg)
+        # Only allow the angle opportunity to take place when no collisions have occured.
+        # This is done so an agent always turns 180 degrees. Any small change in the number of degrees
+        # allows the agent to possibly escape the obstacle.
+        if not collision and not self._still_stuck and 0.25 > should_change_angle:
+            self.move.rotate_ip(deg)
+
+        self.move.normalize()
 
-            self.move.normalize()
+        # Actually update the position at last.
+        self.pos += self.move
 
-            # Actually update the position at last.
-            self.pos += self.move
+class ScentHeadless(ImagelessSimulation, HeadlessSimulation):
+    config: AllConfig
 
-        # If agent is used as scent: Give it no movement ability
-        else:
-            pass
+    def __init__(self, config: AllConfig, recorder):
+        super().__init__(config)
+        # Snapshot rows go straight to the recorder instead of Violet's in-memory metrics
+        self.shared.recorder = recorder
+        # Parameters of this model, read by the agents
+        self.shared.params = Params(config, "scent")
+        # Dead foxes and rabbits are kept here and revived for births
+        self.shared.pool = AgentPool()
+        # Every random draw of the model comes from this per-simulation stream derived from config.seed
+        self.shared.rng = RandomStream(config.seed)
+        # Optional Checkpointer that saves the simulation state every N frames
+        self.checkpointer = None
+        # Stop conditions that can end the run before its duration
+        self.shared.early_stop = EarlyStop(config)
+        # Scent is kept in a compact field shared by all agents instead of as Rabbit agents
+        self.shared.scent_field = ScentField(config.scent)
+        # Min-heap of (frame, id, grass) for eaten grass, ordered by the frame it grows back
+        self.shared.regrowth = []
+        # Neighbours are bucketed once per tick and shared by every call site
+        self.shared.index = NeighbourIndex(config.radius, scent_field=self.shared.scent_field)
+
+    def before_update(self):
+        super().before_update()
+        # Agents that died last frame can be reused from now on
+        self.shared.pool.next_frame()
+        # Grass that is due grows back before any agent looks at it this frame
+        regrowth = self.shared.regrowth
+        while regrowth and regrowth[0][0] <= self.shared.counter:
+            heapq.heappop(regrowth)[2].regrow()
+        self.shared.index.rebuild(self.all_agents(), self.shared.counter)
+
+    def _HeadlessSimulation__update_positions(self):
+        # Violet's move phase (name mangled). Neighbours found while moving are stale once everyone moved
+        super()._HeadlessSimulation__update_positions()
+        self.shared.index.moved()
+
+    def after_update(self):
+        # Count down all scent timers once per tick
+        self.shared.scent_field.decay()
+        self.shared.recorder.end_frame(self.shared.counter)
+
+        if self.shared.early_stop.enabled:
+            foxes   = sum(1 for agent in self._agents if type(agent) is Fox)
+            rabbits = sum(1 for agent in self._agents if type(agent) is Rabbit)
+            reason  = self.shared.early_stop.after_frame(foxes, rabbits)
+            if reason is not None:
+                # Finish this frame and end the run, the recorder keeps when and why it stopped
+                self.shared.recorder.stopped(self.shared.counter, reason)
+                self.stop()
+                return
+
+        if self.checkpointer is not None:
+            self.checkpointer.after_tick(self)
 
 ########################################
 ###            Simulation            ###
 ########################################
 
-def run_simulation(config: AllConfig) -> pl.DataFrame:
-    df = (
-        HeadlessSimulation(config)
-        .batch_spawn_agents(20, Fox, images=["images/fox.png"])
-        .batch_spawn_agents(20, Rabbit, images=["images/rabbit.png", "images/white.png"])
-        .batch_spawn_agents(60, Grass, images=["images/green.png", "images/red.png"])
-        .run()
-        .snapshots
-    )
+def make_simulation(config: AllConfig, out_dir: str = "snapshots", recording: str = "snapshots",
+                    checkpoint_dir: str = None, checkpoint_every: int = 60 * 60,
+                    foxes: int = 20, rabbits: int = 20, grass: int = 60) -> ScentHeadless:
+    # A simulation that is ready to run: either freshly spawned with the given population,
+    # or restored from the latest checkpoint in checkpoint_dir.
+    recorder = make_recorder(recording, os.path.join(out_dir, "scent_run_"+str(config.id)))
+    sim = ScentHeadless(config, recorder)
+
+    # Sprite images per agent class; the headless agents are points, so these files are never loaded
+    images = {
+        "Fox":    (Fox,    ["images/fox.png"]),
+        "Rabbit": (Rabbit, ["images/rabbit.png"]),
+        "Grass":  (Grass,  ["images/green.png", "images/red.png"]),
+    }
+
+    state = None
+    if checkpoint_dir is not None:
+        key = config_key(config, sys.modules[__name__], recording+"/"+str((foxes, rabbits, grass)))
+        sim.checkpointer = Checkpointer(os.path.join(checkpoint_dir, key + ".ckpt"), checkpoint_every, ("recorder", "rng", "scent_field", "early_stop"))
+        state = sim.checkpointer.load()
+
+    if state is None:
+        (
+            sim
+            .batch_spawn_agents(foxes, Fox, images=images["Fox"][1])
+            .batch_spawn_agents(rabbits, Rabbit, images=images["Rabbit"][1])
+            .batch_spawn_agents(grass, Grass, images=images["Grass"][1])
+        )
+    else:
+        print("Resuming simulation ID "+str(config.id)+" from frame "+str(state["frame"]))
+        sim.checkpointer.restore(sim, state, images)
+        # The regrowth schedule refers to agents, so it is rebuilt from the restored grass
+        sim.shared.regrowth = [(agent.regrow_at, agent.id, agent) for agent in sim.all_agents() if type(agent) is Grass and agent.state == 0]
+        heapq.heapify(sim.shared.regrowth)
+
+    # Grass is only changed by the animals and the regrowth heap, Violet's move and update phases skip it
+    sim.set_aside_static()
+    return sim
+
+def run_simulation(config: AllConfig, out_dir: str = "snapshots", recording: str = "snapshots",
+                   checkpoint_dir: str = None, checkpoint_every: int = 60 * 60,
+                   foxes: int = 20, rabbits: int = 20, grass: int = 60, profile: bool = False):
+    # With recording="snapshots" every agent row is streamed to a directory of Parquet files and its path is returned.
+    # With recording="counts" only the per-frame population counts are kept and returned as a DataFrame.
+    # With a checkpoint_dir the state is saved every checkpoint_every frames and an interrupted run resumes from it.
+    # With profile=True the time spent per agent kind and phase is written to profile.json in the run directory.
+    sim = make_simulation(config, out_dir, recording, checkpoint_dir, checkpoint_every, foxes, rabbits, grass)
+
+    profiler = None
+    if profile:
+        profiler = Profiler()
+        profiler.attach(sim, [Fox, Rabbit, Grass])
+
+    sim.run()
+    result = sim.shared.recorder.close()
+    if profiler is not None:
+        profiler.detach()
+        profiler.save(os.path.join(out_dir, "scent_run_"+str(config.id), "profile.json"))
+        profiler.print_summary()
+    if sim.checkpointer is not None:
+        sim.checkpointer.remove()
     print()
     print("Finished! Simulation ID "+str(config.id))
     print()
-    return df
-
+    return result
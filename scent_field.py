@@ -0,0 +1,90 @@
+import numpy as np
+
+
+#######################################
+###           Scent Field           ###
+#######################################
+
+class ScentField:
+    # Compact storage for the scent trails left behind by rabbits.
+    # Every scent is a row in a set of flat arrays (x, y, strength, owner) instead of
+    # a full Rabbit agent, so scent no longer goes through update, change_position,
+    # save_data or any of the proximity queries of the simulation.
+
+    def __init__(self, lifetime: int, capacity: int = 1024):
+        self.lifetime = lifetime                                # Strength of a freshly dropped scent (config.scent)
+        self.size     = 0                                       # Number of scents currently stored
+
+        self.x        = np.zeros(capacity, dtype=np.float64)
+        self.y        = np.zeros(capacity, dtype=np.float64)
+        self.strength = np.zeros(capacity, dtype=np.int32)      # Counts down by one every tick
+        self.owner    = np.zeros(capacity, dtype=np.int64)      # ID of the rabbit that dropped the scent
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        # Double the capacity once the arrays are full
+        capacity = 2 * len(self.x)
+        for name in ("x", "y", "strength", "owner"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def deposit(self, owner: int, pos):
+        # Drop a new scent at the given position
+        if self.size == len(self.x):
+            self._grow()
+
+        i = self.size
+        self.x[i], self.y[i] = pos[0], pos[1]
+        self.strength[i]     = self.lifetime
+        self.owner[i]        = owner
+        self.size += 1
+
+    def deposit_many(self, owners, xs, ys):
+        # Drop a batch of scents at once, used by the vectorised engine
+        k = len(owners)
+        while self.size + k > len(self.x):
+            self._grow()
+
+        i, j = self.size, self.size + k
+        self.x[i:j], self.y[i:j] = xs, ys
+        self.strength[i:j]       = self.lifetime
+        self.owner[i:j]          = owners
+        self.size = j
+
+    def drop_owners(self, owners):
+        # Batch version of drop_owner
+        n = self.size
+        self.strength[:n][np.isin(self.owner[:n], owners)] = 0
+
+    def drop_owner(self, owner: int):
+        # Scent disappears together with the rabbit that left it behind.
+        # The entries are removed the next time the field decays.
+        n = self.size
+        self.strength[:n][self.owner[:n] == owner] = 0
+
+    def decay(self):
+        # Count down every scent timer and compact away the scents that ran out
+        n = self.size
+        self.strength[:n] -= 1
+
+        alive = np.flatnonzero(self.strength[:n] > 0)
+        m = len(alive)
+        if m < n:
+            for name in ("x", "y", "strength", "owner"):
+                arr = getattr(self, name)
+                arr[:m] = arr[alive]
+            self.size = m
+
+    def near(self, pos, radius: float):
+        # Return the offsets (dx, dy), distances and strengths of all scents within radius of pos
+        n = self.size
+        dx = self.x[:n] - pos[0]
+        dy = self.y[:n] - pos[1]
+        dist = np.sqrt(dx * dx + dy * dy)
+
+        inside = dist <= radius
+        return dx[inside], dy[inside], dist[inside], self.strength[:n][inside]
@@ -0,0 +1,100 @@
+import math
+from collections import defaultdict
+
+
+#######################################
+###         Neighbour Index         ###
+#######################################
+
+class Neighbours:
+    # The agents around a single agent, bucketed by kind (agent class).
+    # Every bucket holds (agent, distance) pairs of the agents within radius.
+    __slots__ = ("_buckets", "_index", "_pos", "_scent")
+
+    def __init__(self, buckets, index, pos):
+        self._buckets = buckets
+        self._index   = index
+        self._pos     = pos
+        self._scent   = None
+
+    def first(self, kind, predicate=None):
+        # The first living agent of this kind within radius (optionally matching predicate)
+        for agent, _ in self._buckets.get(kind, ()):
+            if agent.is_alive() and (predicate is None or predicate(agent)):
+                return agent
+        return None
+
+    def nearest(self, kind):
+        # The closest living agent of this kind within radius and its distance, or (None, None).
+        # One pass over the bucket, reusing the distances computed by the index.
+        best, best_dist = None, None
+        for agent, dist in self._buckets.get(kind, ()):
+            if (best_dist is None or dist < best_dist) and agent.is_alive():
+                best, best_dist = agent, dist
+        return best, best_dist
+
+    @property
+    def scent(self):
+        # Scents within radius as (dx, dy, distance, strength) arrays, sampled once per agent per tick
+        if self._scent is None:
+            self._scent = self._index.scent_field.near(self._pos, self._index.radius)
+        return self._scent
+
+
+class NeighbourIndex:
+    # Uniform grid over all agents, rebuilt once per frame.
+    # Agents ask for their neighbours through `neighbours`, which runs the proximity
+    # scan only on the first call of the phase and caches the result for later call sites.
+    # The cache is dropped after the move phase (`moved`), so update sees where everyone moved to.
+
+    def __init__(self, radius: float, margin: float = 8, scent_field=None):
+        self.radius      = radius
+        self.margin      = margin       # Slack for agents that move after the grid was built
+        self.cell        = radius
+        self.scent_field = scent_field
+        self.frame       = -1
+        self._cells      = {}
+        self._cache      = {}
+
+    def rebuild(self, agents, frame: int):
+        # Bucket every agent into its grid cell
+        cells = defaultdict(list)
+        cell = self.cell
+        for agent in agents:
+            cells[(int(agent.pos.x // cell), int(agent.pos.y // cell))].append(agent)
+
+        self._cells = cells
+        self._cache = {}
+        self.frame  = frame
+
+    def moved(self):
+        # Every agent has moved: distances found before are stale. The grid stays, margin covers one move.
+        self._cache = {}
+
+    def neighbours(self, agent) -> Neighbours:
+        cached = self._cache.get(agent.id)
+        if cached is not None:
+            return cached
+
+        pos = agent.pos
+        reach = self.radius + self.margin
+        cell = self.cell
+        x0, x1 = math.floor((pos.x - reach) / cell), math.floor((pos.x + reach) / cell)
+        y0, y1 = math.floor((pos.y - reach) / cell), math.floor((pos.y + reach) / cell)
+
+        # Scan the surrounding cells once and sort the agents within radius by kind
+        buckets = {}
+        radius = self.radius
+        cells = self._cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                for other in cells.get((cx, cy), ()):
+                    if other is agent:
+                        continue
+                    dist = pos.distance_to(other.pos)
+                    if dist <= radius:
+                        buckets.setdefault(type(other), []).append((other, dist))
+
+        result = Neighbours(buckets, self, pos.copy())
+        self._cache[agent.id] = result
+        return result
@@ -0,0 +1,152 @@
+import os
+import queue
+import resource
+import traceback
+import multiprocessing as mp
+from collections import deque
+
+
+#######################################
+###           Job Ordering          ###
+#######################################
+
+def estimated_cost(config) -> int:
+    # Runtime of a simulation grows with its duration and the population it may reach
+    return config.duration * (getattr(config, "max_fox", 100) + getattr(config, "max_rabbit", 100))
+
+def chunked(jobs, size: int):
+    return [jobs[start:start + size] for start in range(0, len(jobs), size)]
+
+
+#######################################
+###             Workers             ###
+#######################################
+
+def rss_mb() -> float:
+    # Current resident memory of this process; falls back to the peak where /proc is missing
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _work(wid, function, tasks, results, max_rss_mb, initializer):
+    # Worker loop: run chunks until told to stop, and quit by itself once it uses too much memory
+    if initializer is not None:
+        initializer()
+    while True:
+        chunk = tasks.get()
+        if chunk is None:
+            return
+        for index, job in chunk:
+            try:
+                results.put(("result", wid, index, function(job)))
+            except Exception:
+                results.put(("error", wid, index, traceback.format_exc()))
+        recycle = max_rss_mb is not None and rss_mb() > max_rss_mb
+        results.put(("done", wid, None, recycle))
+        if recycle:
+            return
+
+
+#######################################
+###          Sweep Executor         ###
+#######################################
+
+class SweepExecutor:
+    # Runs a function over many jobs on long-lived worker processes.
+    # Workers stay warm between jobs (imports, loaded modules) and are only replaced when
+    # their memory grows beyond max_rss_mb, instead of after every job like maxtasksperchild=1.
+    # Jobs are handed out longest first, so the big configurations don't end up as the tail of the sweep.
+    # A worker that dies (e.g. killed for memory) is replaced and its unfinished jobs are run again.
+    # Workers are spawned, not forked: replacements start after the driver has used polars, whose
+    # thread pool doesn't survive a fork. function and initializer must be importable (module level).
+
+    def __init__(self, function, processes: int = None, chunksize: int = 1,
+                 max_rss_mb: float = 1024, initializer=None, context: str = "spawn"):
+        self.function    = function
+        self.processes   = processes or os.cpu_count() or 1
+        self.chunksize   = chunksize
+        self.max_rss_mb  = max_rss_mb
+        self.initializer = initializer
+        self._context    = mp.get_context(context)
+        self._results    = self._context.Queue()
+        self._workers    = {}     # wid -> (process, task queue)
+        self._assigned   = {}     # wid -> chunk the worker is running
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start(self, wid):
+        tasks = self._context.Queue()
+        process = self._context.Process(target=_work, daemon=True,
+                             args=(wid, self.function, tasks, self._results, self.max_rss_mb, self.initializer))
+        process.start()
+        self._workers[wid] = (process, tasks)
+
+    def _assign(self, wid, pending: deque):
+        if pending:
+            chunk = pending.popleft()
+            self._assigned[wid] = chunk
+            self._workers[wid][1].put(chunk)
+        else:
+            self._assigned.pop(wid, None)
+            self._workers[wid][1].put(None)
+
+    def imap_unordered(self, jobs, cost=None):
+        # Yields the function's results in order of completion
+        jobs = list(enumerate(jobs))
+        if cost is not None:
+            jobs.sort(key=lambda job: cost(job[1]), reverse=True)
+        pending = deque(chunked(jobs, self.chunksize))
+        remaining = len(jobs)
+
+        for wid in range(min(self.processes, len(pending))):
+            self._start(wid)
+            self._assign(wid, pending)
+
+        while remaining:
+            try:
+                message, wid, index, value = self._results.get(timeout=1)
+            except queue.Empty:
+                self._replace_dead(pending)
+                continue
+
+            if message == "result":
+                # Drop the finished job from the chunk, so a crash later on doesn't run it twice
+                self._assigned[wid] = [job for job in self._assigned[wid] if job[0] != index]
+                remaining -= 1
+                yield value
+            elif message == "error":
+                raise RuntimeError("Sweep job failed in a worker:\n" + value)
+            elif message == "done":
+                self._assigned.pop(wid, None)
+                if value:
+                    # Worker recycled itself for using too much memory
+                    self._workers[wid][0].join()
+                    self._start(wid)
+                self._assign(wid, pending)
+
+    def _replace_dead(self, pending: deque):
+        for wid, (process, _) in list(self._workers.items()):
+            chunk = self._assigned.get(wid)
+            if chunk is not None and not process.is_alive():
+                print("Worker %d exited with code %s, restarting its %d job(s)" % (wid, process.exitcode, len(chunk)))
+                if chunk:
+                    pending.appendleft(chunk)
+                self._start(wid)
+                self._assign(wid, pending)
+
+    def close(self):
+        for process, tasks in self._workers.values():
+            if process.is_alive():
+                tasks.put(None)
+        for process, _ in self._workers.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._workers  = {}
+        self._assigned = {}
@@ -0,0 +1,27 @@
+import pytest
+from AllMatrixes import AllConfig
+from agent_pool import AgentPool
+import run_base_model_15
+import run_scent_model_15
+from test_vector_engine import PARAMS
+
+
+@pytest.mark.parametrize("module", [run_base_model_15, run_scent_model_15])
+def test_pooled_run_matches_unpooled(module, monkeypatch):
+    config = AllConfig(duration=600, seed=3, **PARAMS)
+    reused = []
+    take = AgentPool.take
+
+    def counted(self, cls):
+        agent = take(self, cls)
+        if agent is not None:
+            reused.append(agent)
+        return agent
+
+    monkeypatch.setattr(AgentPool, "take", counted)
+    pooled = module.run_simulation(config, recording="counts")
+    assert reused
+
+    # A pool that never hands out an agent: every birth is a new sprite, as without the pool
+    monkeypatch.setattr(AgentPool, "take", lambda self, cls: None)
+    assert module.run_simulation(config, recording="counts").equals(pooled)
@@ -0,0 +1,30 @@
+import pickle
+import pytest
+from AllMatrixes import AllConfig
+import run_base_model_15
+import run_scent_model_15
+
+
+@pytest.mark.parametrize("module", [run_base_model_15, run_scent_model_15])
+def test_resumed_run_matches_uninterrupted(module, tmp_path):
+    config = AllConfig(duration=400, seed=4, radius=50)
+    full = module.run_simulation(config, recording="counts")
+
+    # Stop the run between two checkpoints, as a killed worker would
+    sim = module.make_simulation(config, recording="counts", checkpoint_dir=str(tmp_path), checkpoint_every=100)
+    after_update = sim.after_update
+
+    def interrupted():
+        after_update()
+        if sim.shared.counter == 250:
+            raise KeyboardInterrupt
+
+    sim.after_update = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        sim.run()
+    [checkpoint] = tmp_path.glob("*.ckpt")
+    with open(checkpoint, "rb") as f:
+        assert pickle.load(f)["frame"] == 200
+
+    resumed = module.run_simulation(config, recording="counts", checkpoint_dir=str(tmp_path), checkpoint_every=100)
+    assert resumed.equals(full)
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+import pytest
+from AllMatrixes import AllConfig
+from early_stop import EarlyStop
+import run_base_model_15
+import run_scent_model_15
+import vector_engine
+
+
+def early_stop(extinction=0, window=0, variance=0.0):
+    return EarlyStop(SimpleNamespace(stop_on_extinction=extinction, steady_window=window, steady_variance=variance))
+
+
+def test_off_by_default():
+    stop = early_stop()
+    assert not stop.enabled
+    assert stop.check(0, 0) is None
+
+
+@pytest.mark.parametrize("foxes, rabbits, reason", [
+    (0, 0, "extinction"), (0, 5, "fox_extinction"), (5, 0, "rabbit_extinction"), (5, 5, None),
+])
+def test_extinction_reasons(foxes, rabbits, reason):
+    assert early_stop(extinction=1).check(foxes, rabbits) == reason
+
+
+def test_steady_state_needs_a_full_window():
+    stop = early_stop(window=4, variance=0.5)
+    # A varying population, then the same one for a whole window
+    assert [stop.check(10, n) for n in (1, 9, 3, 7)] == [None] * 4
+    assert [stop.check(10, 5) for _ in range(3)] == [None] * 3
+    assert stop.check(10, 5) == "steady_state"
+
+
+def test_stop_comes_one_frame_after_the_condition():
+    stop = early_stop(extinction=1)
+    assert stop.after_frame(3, 4) is None
+    assert stop.after_frame(0, 4) is None
+    assert stop.after_frame(0, 4) == "fox_extinction"
+
+
+# Reason a run stopped for, and whether the foxes and rabbits are gone in its last row
+GONE = {"extinction": (True, True), "fox_extinction": (True, False), "rabbit_extinction": (False, True)}
+
+@pytest.mark.parametrize("run, seed", [
+    (lambda config: run_base_model_15.run_simulation(config, recording="counts"), 1),
+    (lambda config: run_scent_model_15.run_simulation(config, recording="counts"), 2),
+    (lambda config: vector_engine.run_simulation(config, "scent", recording="counts"), 3),
+])
+def test_last_row_agrees_with_stop_reason(run, seed):
+    counts = run(AllConfig(duration=2000, seed=seed, radius=50, stop_on_extinction=1))
+    last = counts.row(-1, named=True)
+    assert last["frame"] < 2000
+    assert (last["fox"] == 0, last["rabbit"] == 0) == GONE[last["stop_reason"]]
@@ -0,0 +1,28 @@
+import polars as pl
+from handoff import HandoffDir, export
+
+
+def test_handoff_round_trip():
+    df = pl.DataFrame({
+        "frame":  pl.Series([0, 1, 2, 3], dtype=pl.Int32),
+        "x":      pl.Series([0.5, 1.5, -2.0, 3.25], dtype=pl.Float64),
+        "small":  pl.Series([1, -1, 0, 7], dtype=pl.Int8),
+        "alive":  [True, False, True, True],
+        "agent":  ["fox", "rabbit", "fox", "grass"],
+        "energy": [10, None, 30, 40],
+        "note":   ["a", None, "b", "c"],
+    })
+    with HandoffDir() as directory:
+        handoff = export(df, directory.path, "job")
+        # Only the columns with nulls travel with the record
+        assert handoff.inline.columns == ["energy", "note"]
+        loaded = handoff.load()
+        assert loaded.equals(df)
+        assert loaded.schema == df.schema
+        handoff.release()
+
+
+def test_handoff_round_trip_empty_table():
+    df = pl.DataFrame({"frame": pl.Series([], dtype=pl.Int32), "agent": pl.Series([], dtype=pl.String)})
+    with HandoffDir() as directory:
+        assert export(df, directory.path, "empty").load().equals(df)
@@ -0,0 +1,51 @@
+import pygame
+from vi.proximity import ProximityEngine
+from AllMatrixes import AllConfig
+from headless import ImagelessSimulation, NoProximity
+import run_base_model_15
+import run_scent_model_15
+
+
+def run(module, config, proximity: bool):
+    sim = module.make_simulation(config, recording="counts")
+    assert isinstance(sim._proximity, NoProximity)
+    if proximity:
+        sim._proximity = ProximityEngine(sim._agents, config.radius)
+    sim.run()
+    return sim.shared.recorder.close()
+
+def test_no_proximity_chunks():
+    # Nothing reads Violet's proximity chunks, runs are the same without them
+    for module in (run_base_model_15, run_scent_model_15):
+        config = AllConfig(duration=200, seed=1, radius=50)
+        assert run(module, config, proximity=False).equals(run(module, config, proximity=True))
+
+
+def test_grass_is_kept_out_of_the_per_tick_loops(monkeypatch):
+    config = AllConfig(duration=300, seed=3, radius=50)
+    for module in (run_base_model_15, run_scent_model_15):
+        sim = module.make_simulation(config, recording="counts")
+        grass = [agent for agent in sim.all_agents() if type(agent) is module.Grass]
+        assert len(grass) == 60
+        assert not any(type(agent) is module.Grass for agent in sim._all)
+        assert all(agent.is_alive() for agent in grass)
+        sim.run()
+        counts = sim.shared.recorder.close()
+
+        # Grass left in Violet's groups is visited every tick, to the same result
+        monkeypatch.setattr(ImagelessSimulation, "set_aside_static", lambda self: None)
+        assert module.run_simulation(config, recording="counts").equals(counts)
+        monkeypatch.undo()
+
+
+def test_no_images_are_loaded(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("a headless run loaded an image")
+    monkeypatch.setattr(pygame.image, "load", fail)
+    monkeypatch.setattr(pygame, "Surface", fail)
+
+    for module in (run_base_model_15, run_scent_model_15):
+        sim = module.make_simulation(AllConfig(duration=50, seed=1, radius=50), recording="counts")
+        assert all(agent.image is None for agent in sim.all_agents())
+        sim.run()
+        assert sim.shared.recorder.close()["frame"].max() == 50
@@ -0,0 +1,33 @@
+import dataclasses
+import pickle
+import pytest
+from AllMatrixes import AllConfig, Params
+from parameters import ALL_PARAMETERS, MODEL_MODULES, MODEL_PARAMETERS
+
+
+def test_params_are_read_only():
+    params = Params(AllConfig(fox_energy=123), "base")
+    assert params.fox_energy == 123
+    with pytest.raises(AttributeError):
+        params.fox_energy = 1
+    assert params.fox_energy == 123
+    with pytest.raises(TypeError):
+        pickle.dumps(params)
+
+def test_params_reject_unknown_names():
+    params = Params(AllConfig(), "base")
+    with pytest.raises(AttributeError):
+        params.fox_enrgy
+    with pytest.raises(AttributeError):
+        params.fox_enrgy = 1
+    # A parameter of another model isn't set for this one
+    with pytest.raises(AttributeError):
+        params.scent
+    assert Params(AllConfig(scent=77), "scent").scent == 77
+    with pytest.raises(KeyError):
+        Params(AllConfig(), "nonexistent")
+
+def test_every_parameter_is_a_config_field():
+    fields = {field.name for field in dataclasses.fields(AllConfig)}
+    assert set(ALL_PARAMETERS) <= fields
+    assert set(MODEL_PARAMETERS) == set(MODEL_MODULES)
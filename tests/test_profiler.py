@@ -0,0 +1,24 @@
+import json
+from AllMatrixes import AllConfig
+import run_scent_model_15
+from run_scent_model_15 import Fox, Rabbit
+
+
+def test_profiled_run(tmp_path):
+    config = AllConfig(duration=100, seed=1, radius=50)
+    methods = {cls: dict(vars(cls)) for cls in (Fox, Rabbit)}
+    counts = run_scent_model_15.run_simulation(config, recording="counts")
+    profiled = run_scent_model_15.run_simulation(config, str(tmp_path), recording="counts", profile=True)
+
+    # Profiling doesn't change the run and leaves the classes as they were
+    assert profiled.equals(counts)
+    assert {cls: dict(vars(cls)) for cls in (Fox, Rabbit)} == methods
+
+    with open(tmp_path / ("scent_run_"+str(config.id)) / "profile.json") as f:
+        rows = {(row["kind"], row["phase"]): row for row in json.load(f)}
+    # Every fox and rabbit updates once per frame
+    assert rows[("Fox", "update")]["calls"] == counts["fox"].sum()
+    assert rows[("Rabbit", "update")]["calls"] == counts["rabbit"].sum()
+    assert {("Fox", "sense"), ("Rabbit", "record"), ("simulation", "index_rebuild")} <= rows.keys()
+    assert rows[("simulation", "index_rebuild")]["calls"] == 101
+    assert abs(sum(row["share"] for row in rows.values()) - 1) < 1e-9
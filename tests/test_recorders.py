@@ -0,0 +1,80 @@
+import numpy as np
+import polars as pl
+from AllMatrixes import AllConfig
+from recorders import COUNTS_SCHEMA, SNAPSHOT_SCHEMA, CountRecorder, delta_decode, delta_encode, population_counts, scan_snapshots
+import run_base_model_15
+import run_scent_model_15
+import vector_engine
+
+
+def rows(*values) -> pl.DataFrame:
+    return pl.DataFrame(values, schema=SNAPSHOT_SCHEMA, orient="row")
+
+
+def test_delta_encoding_round_trip():
+    # frame, id, x, y, agent, age, max_lifespan, energy, reproduce, eat
+    full = rows(
+        (0, 1, 10, 10, "rabbit", 0, 500, 100, 0, 0),
+        (0, 2, 20, 20, "grass",  0,   0,   0, 0, 0),
+        (1, 1, 11, 10, "rabbit", 1, 500,  99, 0, 0),
+        (2, 1, 12, 10, "rabbit", 2, 500, 150, 0, 1),   # Ate: energy off its prediction
+        (3, 1, 13, 10, "rabbit", 3, 500, 149, 1, 0),
+        (5, 2, 20, 20, "dead_grass", 0, 0, 0, 0, 0),   # Static agent changed kind
+        (6, 3, 30, 30, "fox",    0, 800, 300, 0, 0),   # Born mid-run
+        (7, 3, 31, 30, "fox",    1, 800, 299, 0, 0),
+    )
+    encoded = delta_encode(full)
+    # Only the rows that break their prediction keep their fields
+    assert encoded["energy"].to_list() == [100, 0, None, 150, None, None, 300, None]
+    assert encoded["agent"].to_list() == ["rabbit", "grass", None, None, None, "dead_grass", "fox", None]
+    assert encoded["eat"].null_count() == 7
+    assert delta_decode(encoded.lazy()).collect().equals(full)
+
+
+def test_recorded_run_round_trip(tmp_path):
+    config = AllConfig(duration=200, seed=1, radius=50)
+    path = run_base_model_15.run_simulation(config, str(tmp_path), recording="snapshots")
+    full = scan_snapshots(path).collect()
+    assert full.height > 0
+    assert delta_decode(delta_encode(full).lazy()).collect().equals(full)
+
+
+def test_count_recorder():
+    recorder = CountRecorder()
+    # Frame 0: three new grass patches, a fox that ate and two rabbits, one of them reproduced
+    for _ in range(3):
+        recorder.record_change(None, "grass")
+    recorder.record(None, "fox", eat=1)
+    recorder.record(None, "rabbit", reproduce=1)
+    recorder.record(None, "rabbit")
+    recorder.end_frame(0)
+    # Frame 1: a patch is eaten, grass keeps counting without rows of its own
+    recorder.record_change(None, "dead_grass", previous="grass")
+    recorder.record(None, "rabbit", eat=1)
+    recorder.end_frame(1)
+    # Frame 2: batches as the vector engine records them, the patch grows back
+    recorder.record_many(agent=np.array(["fox", "rabbit", "rabbit"]), eat=np.array([0, 1, 1]), reproduce=np.array([1, 0, 0]))
+    recorder.record_changes(previous=np.array(["dead_grass"]), agent=np.array(["grass"]))
+    recorder.end_frame(2)
+    recorder.stopped(2, "rabbit_extinction")
+
+    counts = recorder.close()
+    assert counts.select(COUNTS_SCHEMA.keys()).rows() == [
+        # frame, fox, rabbit, grass, dead_grass, fox_eat, rabbit_eat, fox_reproduce, rabbit_reproduce
+        (0, 1, 2, 3, 0, 1, 0, 0, 1),
+        (1, 0, 1, 2, 1, 0, 1, 0, 0),
+        (2, 1, 2, 3, 0, 0, 2, 1, 0),
+    ]
+    assert counts["stop_reason"].unique().to_list() == ["rabbit_extinction"]
+
+
+def test_counts_from_snapshots_match_count_recorder(tmp_path):
+    # The same run recorded both ways gives the same table
+    config = AllConfig(duration=300, seed=2, radius=50)
+    for module in (run_base_model_15, run_scent_model_15):
+        path = module.run_simulation(config, str(tmp_path), recording="snapshots")
+        counts = module.run_simulation(config, recording="counts")
+        assert population_counts(scan_snapshots(path)).equals(counts.drop("stop_reason"))
+    path = vector_engine.run_simulation(config, "scent", str(tmp_path), recording="snapshots")
+    counts = vector_engine.run_simulation(config, "scent", recording="counts")
+    assert population_counts(scan_snapshots(path)).equals(counts.drop("stop_reason"))
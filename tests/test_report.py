@@ -0,0 +1,64 @@
+import json
+import math
+import numpy as np
+import polars as pl
+from AllMatrixes import AllConfig
+from parameters import model_module
+from result_cache import ResultCache, config_key
+import report
+
+
+def counts(frames: int, fox: int = 1, stop_reason: str = "duration") -> pl.DataFrame:
+    return pl.DataFrame({"frame": range(frames), "fox": [fox] * frames, "rabbit": [2] * frames, "grass": [3] * frames,
+                         "stop_reason": [stop_reason] * frames})
+
+def test_only_results_of_the_current_source(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    configs = [AllConfig(model="base", seed=seed, duration=10) for seed in (1, 2)]
+    for config in configs:
+        cache.put(config_key(config, model_module("base")), counts(11), config)
+
+    # The same run made by an older version of the model, under another key
+    cache.put("stale", counts(5), configs[0])
+    with open(tmp_path / "stale.json") as f:
+        meta = json.load(f)
+    meta["source"] = "0" * 64
+    with open(tmp_path / "stale.json", "w") as f:
+        json.dump(meta, f)
+    # A result from before the source hash was written
+    counts(5).write_parquet(tmp_path / "old.parquet")
+    with open(tmp_path / "old.json", "w") as f:
+        json.dump(meta["config"], f)
+
+    points = report.cached_points(str(tmp_path))
+    assert len(points) == 1
+    (config, runs), = points.values()
+    assert sorted(seed for seed, _ in runs) == [1, 2]
+    assert all("stale" not in path and "old" not in path for _, path in runs)
+    assert report.run_statistics(report.scan_runs(runs))["runs"] == 2
+
+
+def test_runs_stopped_on_an_extinction(tmp_path):
+    # One run to the end, one that stopped when its foxes died out
+    counts(11, fox=4).write_parquet(tmp_path / "full.parquet")
+    counts(6, fox=1, stop_reason="fox_extinction").write_parquet(tmp_path / "stopped.parquet")
+    runs = [(1, str(tmp_path / "full.parquet")), (2, str(tmp_path / "stopped.parquet"))]
+
+    stats = report.run_statistics(report.scan_runs(runs))
+    assert stats["fox_extinction"] == 0.5
+    assert stats["rabbit_extinction"] == 0.0
+
+    # After the stop the foxes of the stopped run count as 0, its rabbits and grass are left out
+    curves = report.population_curves(report.scan_runs(runs))
+    assert curves["frame"].to_list() == list(range(11))
+    last = curves.row(-1, named=True)
+    assert (last["runs"], last["fox_mean"], last["rabbit_mean"], last["rabbit_ci"]) == (2, 2.0, 2.0, 0)
+    assert curves["fox_mean"][0] == 2.5
+
+def test_oscillation_period():
+    frames = np.arange(600)
+    assert abs(report.oscillation_period((50 + 20 * np.sin(2 * np.pi * frames / 100)).round()) - 100) < 5
+    # A trend, a wobble of an animal and less than two cycles have no period
+    assert math.isnan(report.oscillation_period(np.linspace(60, 5, 600).round()))
+    assert math.isnan(report.oscillation_period(50 + frames % 2))
+    assert math.isnan(report.oscillation_period((50 + 20 * np.sin(2 * np.pi * frames / 400)).round()))
@@ -0,0 +1,39 @@
+import os
+import polars as pl
+from AllMatrixes import AllConfig
+from parameters import model_module
+from result_cache import ResultCache, config_key
+
+
+def table(value: int) -> pl.DataFrame:
+    return pl.DataFrame({"frame": range(100), "fox": [value] * 100})
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put("a", table(1), AllConfig(seed=1))
+    size = os.path.getsize(cache.path("a"))
+    # Room for two results
+    cache.max_bytes = int(2.5 * size)
+    cache.put("b", table(2), AllConfig(seed=2))
+    os.utime(cache.path("a"), (1000, 1000))
+    os.utime(cache.path("b"), (2000, 2000))
+
+    # Reading a result makes it the most recently used, so b goes first
+    assert cache.get("a")["fox"][0] == 1
+    cache.put("c", table(3), AllConfig(seed=3))
+    assert cache.get("b") is None
+    assert not os.path.exists(tmp_path / "b.json")
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert sum(os.path.getsize(cache.path(key)) for key in "ac") <= cache.max_bytes
+
+def test_missing_result_is_a_miss(tmp_path):
+    assert ResultCache(str(tmp_path)).get("nothing") is None
+
+def test_keys():
+    base = model_module("base")
+    key = config_key(AllConfig(model="base", seed=1), base)
+    assert key == config_key(AllConfig(model="base", seed=1), base)
+    assert key != config_key(AllConfig(model="base", seed=2), base)
+    assert key != config_key(AllConfig(model="base", seed=1, fox_energy=1), base)
+    # A parameter the model doesn't read makes no other run
+    assert key == config_key(AllConfig(model="base", seed=1, scent=1), base)
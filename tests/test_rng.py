@@ -0,0 +1,28 @@
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from AllMatrixes import AllConfig
+from parameters import model_module
+from rng import RandomStream
+
+
+def counts(model: str, seed: int):
+    return model_module(model).run_simulation(AllConfig(model=model, duration=200, seed=seed, radius=50), recording="counts")
+
+
+def test_same_seed_same_counts_in_other_processes():
+    models = ["base", "scent", "vector_scent"]
+    with ProcessPoolExecutor(2, mp_context=mp.get_context("spawn")) as pool:
+        runs = list(pool.map(counts, models + models, [7] * 6))
+    for model, first, second in zip(models, runs, runs[3:]):
+        here = counts(model, 7)
+        assert first.equals(here) and second.equals(here), model
+        assert not counts(model, 8).equals(here), model
+
+def test_streams_of_a_seed():
+    draws = lambda stream: [stream.random() for _ in range(5)] + [stream.gauss(0, 1) for _ in range(5)]
+    assert draws(RandomStream(5)) == draws(RandomStream(5))
+    assert draws(RandomStream(5)) != draws(RandomStream(5, "other"))
+    assert draws(RandomStream(5)) != draws(RandomStream(6))
+    # A run without a seed keeps the one it drew, so it can be repeated
+    unseeded = RandomStream(None)
+    assert draws(RandomStream(unseeded.seed)) == draws(unseeded)
@@ -0,0 +1,57 @@
+import numpy as np
+from AllMatrixes import AllConfig
+import run_scent_model_15
+
+
+def test_dead_rabbits_leave_no_scent():
+    # Short lived rabbits that drop scent every tick, so many of them die on a tick they drop scent
+    config = AllConfig(duration=60, seed=1, radius=50, rabbit_lifespan=40, scent=1000, scent_interval=1)
+    sim = run_scent_model_15.make_simulation(config, recording="counts")
+    sim.run()
+    sim.shared.recorder.close()
+
+    field = sim.shared.scent_field
+    living = [agent.id for agent in sim._all if isinstance(agent, run_scent_model_15.Rabbit) and agent.is_alive()]
+    owners = field.owner[:field.size][field.strength[:field.size] > 0]
+    assert np.isin(owners, living).all()
+
+
+class Around:
+    # Neighbours of a fox: an optional rabbit and the scents as (dx, dy, distance, strength) arrays
+    def __init__(self, rabbit=None, scents=()):
+        self.rabbit = rabbit
+        self.scents = scents
+
+    def nearest(self, kind):
+        assert kind is run_scent_model_15.Rabbit
+        return (self.rabbit, 30.0) if self.rabbit is not None else (None, None)
+
+    @property
+    def scent(self):
+        # The fox ignores scent when it sees a rabbit, so it must not sample the field then
+        assert self.rabbit is None
+        if not self.scents:
+            return (np.zeros(0),) * 4
+        dx, dy, strength = np.array(self.scents, dtype=float).T
+        return dx, dy, np.hypot(dx, dy), strength
+
+
+def test_fox_senses_rabbit_before_scent():
+    rabbit = object()
+    assert run_scent_model_15.Fox.sense(None, Around(rabbit, [(20, 0, 5)])) == (rabbit, 30.0, None)
+    assert run_scent_model_15.Fox.sense(None, Around()) == (None, None, None)
+
+def test_fox_follows_weighted_scent():
+    scents = [(30, 0, 2), (0, -40, 1), (3, 4, 9)]   # The last one is within 10 and ignored
+    rabbit, dist, vector = run_scent_model_15.Fox.sense(None, Around(scents=scents))
+    assert rabbit is None and dist is None
+
+    # One scent at a time, as the scent model did when scents were agents
+    x = y = 0.0
+    for dx, dy, strength in scents:
+        d = (dx * dx + dy * dy) ** 0.5
+        if d > 10:
+            weight = d ** 3 * strength ** 4 / 1200
+            x, y = x + dx * weight, y + dy * weight
+    length = (x * x + y * y) ** 0.5
+    assert np.allclose((vector.x, vector.y), (x / length, y / length))
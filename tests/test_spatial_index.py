@@ -0,0 +1,31 @@
+from pygame.math import Vector2
+from spatial_index import NeighbourIndex
+
+
+class Point:
+    def __init__(self, id, x, y):
+        self.id  = id
+        self.pos = Vector2(x, y)
+
+    def is_alive(self):
+        return True
+
+
+def test_first_in_grid_order():
+    a, b, c = Point(0, 10, 10), Point(1, 30, 10), Point(2, 12, 10)
+    index = NeighbourIndex(radius=25)
+    index.rebuild([a, b, c], frame=0)
+    # b and c are in range, c is in the lower grid cell
+    assert index.neighbours(a).first(Point) is c
+    assert index.neighbours(a).nearest(Point) == (c, 2)
+
+def test_neighbours_after_the_move_phase():
+    a, b = Point(0, 10, 10), Point(1, 30, 10)
+    index = NeighbourIndex(radius=25)
+    index.rebuild([a, b], frame=0)
+    assert index.neighbours(a).first(Point) is b
+    b.pos.x = 36
+    # Within a phase the first lookup is reused, after the move phase it is done again
+    assert index.neighbours(a).first(Point) is b
+    index.moved()
+    assert index.neighbours(a).first(Point) is None
@@ -0,0 +1,37 @@
+import os
+import polars as pl
+from sweep import SweepExecutor
+
+
+def square(job):
+    return job * job
+
+def grow(job):
+    # Allocates enough to be over any memory limit, so the worker recycles itself after every chunk
+    global ballast
+    ballast = bytearray(64 * 1024 ** 2)
+    return job
+
+def crash_once(job):
+    # The first worker to run job 0 dies, its replacement runs it again
+    marker = os.path.join(os.environ["SWEEP_TEST_DIR"], "crashed")
+    if job == 0 and not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return job
+
+
+def test_results_of_every_job():
+    with SweepExecutor(square, processes=2, chunksize=3) as sweep:
+        assert sorted(sweep.imap_unordered(range(10))) == [job * job for job in range(10)]
+
+def test_recycled_workers_after_polars_in_the_driver():
+    # Replacement workers start after the driver used polars' thread pool
+    pl.DataFrame({"a": range(1000)}).group_by(pl.col("a") % 7).agg(pl.len())
+    with SweepExecutor(grow, processes=2, max_rss_mb=1) as sweep:
+        assert sorted(sweep.imap_unordered(range(6))) == list(range(6))
+
+def test_dead_worker_is_replaced(tmp_path, monkeypatch):
+    monkeypatch.setenv("SWEEP_TEST_DIR", str(tmp_path))
+    with SweepExecutor(crash_once, processes=2) as sweep:
+        assert sorted(sweep.imap_unordered(range(4))) == list(range(4))
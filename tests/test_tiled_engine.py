@@ -0,0 +1,19 @@
+from AllMatrixes import AllConfig
+import vector_engine
+from test_vector_engine import PARAMS
+
+
+def run(config, **tiled):
+    engine = vector_engine.make_simulation(config, "base", recording="counts", foxes=60, rabbits=60, grass=60, **tiled)
+    if tiled:
+        # Hand out every search, however small
+        engine.min_pairs = 0
+    engine.run()
+    return engine.recorder.close()
+
+def test_tiled_matches_single_core():
+    # The populations grow past the first capacity of the species arrays, so the shared fields are replaced mid-run
+    config = AllConfig(duration=150, seed=2, **PARAMS)
+    counts = run(config)
+    assert counts["fox"].max() > 64 or counts["rabbit"].max() > 64
+    assert run(config, tiles=(2, 2), processes=2).equals(counts)
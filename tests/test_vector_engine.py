@@ -0,0 +1,60 @@
+import numpy as np
+from AllMatrixes import AllConfig
+from parameters import model_module
+from result_cache import config_key
+import run_base_model_15
+import run_scent_model_15
+import vector_engine
+
+
+# The parameters the engines are compared with: a world where both species live through the run
+PARAMS = dict(radius=50, movement_speed=1.0, fox_energy=10800, fox_hunger_threshold=600, rabbit_nutrition=1800,
+              fox_lifespan=10800, hunt_movespeed=1.1, fox_p_reproduce=0.1, rabbit_energy=10800,
+              rabbit_hunger_threshold=600, grass_nutrition=300, rabbit_lifespan=10800, rabbit_p_reproduce=0.1,
+              grass_t_reproduce=180, max_fox=100, max_rabbit=100)
+
+FRAMES = 1000
+# The populations swing a lot from seed to seed, a handful of seeds can be 30% apart on the same engine
+SEEDS  = range(1, 25)
+
+COLUMNS = ["fox", "rabbit", "fox_eat", "rabbit_eat", "fox_reproduce", "rabbit_reproduce"]
+
+
+def summary(run):
+    # Mean population and total events per run, averaged over the seeds
+    rows = []
+    for seed in SEEDS:
+        counts = run(AllConfig(duration=FRAMES, seed=seed, **PARAMS))
+        rows.append([counts[c].mean() if c in ("fox", "rabbit") else counts[c].sum() for c in COLUMNS])
+    return dict(zip(COLUMNS, np.mean(rows, axis=0)))
+
+
+def test_vector_base_matches_agent_base():
+    # The engines draw different random numbers, so only the averages over several seeds can agree
+    agent = summary(lambda config: run_base_model_15.run_simulation(config, recording="counts"))
+    vector = summary(lambda config: vector_engine.run_simulation(config, "base", recording="counts"))
+    for column in COLUMNS:
+        assert abs(vector[column] - agent[column]) <= 0.25 * agent[column], (column, agent, vector)
+
+
+def test_vector_scent_matches_agent_scent():
+    agent = summary(lambda config: run_scent_model_15.run_simulation(config, recording="counts"))
+    vector = summary(lambda config: vector_engine.run_simulation(config, "scent", recording="counts"))
+    for column in COLUMNS:
+        assert abs(vector[column] - agent[column]) <= 0.25 * agent[column], (column, agent, vector)
+
+
+def test_run_shorter_than_checkpoint_interval(tmp_path):
+    config = AllConfig(duration=100, seed=1, **PARAMS)
+    counts = vector_engine.run_simulation(config, "base", recording="counts", checkpoint_dir=str(tmp_path),
+                                          checkpoint_every=1000)
+    assert counts["frame"].max() == 100
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sweep_runs_the_vector_engine():
+    # A sweep picks the engine through the config's model, like the agent models
+    config = AllConfig(model="vector_scent", duration=50, seed=1, **PARAMS)
+    counts = model_module(config.model).run_simulation(config, recording="counts")
+    assert counts.equals(vector_engine.run_simulation(config, "scent", recording="counts"))
+    assert config_key(config, vector_engine) != config_key(AllConfig(model="vector_base", duration=50, seed=1, **PARAMS), vector_engine)
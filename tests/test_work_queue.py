@@ -0,0 +1,65 @@
+import multiprocessing as mp
+import sqlite3
+import time
+import polars as pl
+from AllMatrixes import AllConfig
+from result_cache import ResultCache
+from work_queue import WorkQueue, run_worker
+
+
+def attempts(path: str) -> dict:
+    db = sqlite3.connect(path)
+    try:
+        return dict(db.execute("SELECT key, attempts FROM jobs").fetchall())
+    finally:
+        db.close()
+
+def test_workers_retry_expired_and_failed_jobs(tmp_path):
+    path, cache_root = str(tmp_path / "sweep.db"), str(tmp_path / "cache")
+    queue = WorkQueue(path, lease=0.5)
+    keys = queue.publish([AllConfig(model="base", seed=seed, duration=5) for seed in (1, 2, 3)])
+
+    # A worker that died while running a job, its lease runs out
+    expired, _, _ = queue.claim("dead")
+    # A job that failed on its first attempt
+    failed, _, _ = queue.claim("crashed")
+    queue.fail(failed, "crashed", "Traceback")
+    time.sleep(0.6)
+
+    context = mp.get_context("spawn")
+    workers = [context.Process(target=run_worker, args=(path, cache_root, str(tmp_path / "checkpoints"), 0.2))
+               for _ in range(2)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+
+    assert queue.status() == {"done": 3}
+    cache = ResultCache(cache_root)
+    assert all(cache.get(key) is not None for key in keys)
+    tries = attempts(path)
+    assert tries[expired] == 2 and tries[failed] == 2
+
+def test_publish_again_resets_failed_and_evicted_jobs(tmp_path):
+    path = str(tmp_path / "sweep.db")
+    cache = ResultCache(str(tmp_path / "cache"))
+    queue = WorkQueue(path, max_attempts=1)
+    configs = [AllConfig(model="base", seed=seed, duration=5) for seed in (1, 2, 3)]
+    queue.publish(configs)
+
+    failed, _, _ = queue.claim("worker")
+    queue.fail(failed, "worker", "Traceback")
+    # Done, but its result is not in the cache
+    evicted, _, _ = queue.claim("worker")
+    queue.complete(evicted, "worker")
+    cached, _, config = queue.claim("worker")
+    cache.put(cached, pl.DataFrame({"frame": [0]}), config)
+    queue.complete(cached, "worker")
+    assert queue.status() == {"failed": 1, "done": 2}
+
+    queue.publish(configs, cache)
+    assert queue.states([failed, evicted, cached]) == {failed: ("pending", None), evicted: ("pending", None),
+                                                        cached: ("done", None)}
+    tries = attempts(path)
+    assert tries[failed] == 0 and tries[evicted] == 0
@@ -0,0 +1,309 @@
+import os
+import multiprocessing as mp
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from vector_engine import Species, VectorEngine, first_within, nearest_within, normalize, pairwise_distance
+
+
+#######################################
+###          Shared Arrays          ###
+#######################################
+
+class SharedArrays:
+    # NumPy arrays in shared memory that the tile workers attach to by name, kept for the whole run.
+    # A slot is a scratch array that is written once per search and grows by doubling.
+    # A field is the buffer of a species field itself (see SharedSpecies): the engine moves its agents
+    # in it and the workers read it in place, nothing is copied for a search.
+    # Replaced blocks are unlinked at once, but arrays on them may still be in use (e.g. a field that is being
+    # copied to its bigger block), and closing a block doesn't wait for them. They are closed by close_retired
+    # between ticks.
+
+    def __init__(self):
+        self._blocks   = {}     # slot -> block
+        self._address  = {}     # block name -> address of its buffer in this process
+        self._retired  = []
+
+    def _create(self, slot: str, size: int):
+        old = self._blocks.get(slot)
+        if old is not None:
+            old.unlink()
+            self._retired.append(old)
+        block = shared_memory.SharedMemory(create=True, size=max(size, 4096))
+        start = np.frombuffer(block.buf, dtype=np.uint8)
+        self._address[block.name] = start.ctypes.data
+        del start
+        self._blocks[slot] = block
+        return block
+
+    def close_retired(self):
+        for block in self._retired:
+            block.close()
+            self._address.pop(block.name, None)
+        self._retired = []
+
+    def array(self, slot: str, length: int, dtype):
+        # A scratch view of `length` elements and the spec a worker attaches it with
+        dtype = np.dtype(dtype)
+        need = max(length, 1) * dtype.itemsize
+        block = self._blocks.get(slot)
+        if block is None or block.size < need:
+            block = self._create(slot, 2 * need)
+        return np.ndarray(length, dtype=dtype, buffer=block.buf), (block.name, length, dtype.str)
+
+    def field(self, slot: str, capacity: int, dtype):
+        # A new buffer for a species field, the fields grow by doubling themselves
+        dtype = np.dtype(dtype)
+        block = self._create(slot, capacity * dtype.itemsize)
+        return np.ndarray(capacity, dtype=dtype, buffer=block.buf)
+
+    def put(self, slot: str, values):
+        # Spec of values for the workers. Values at the start of a field (a species view) are passed as they are,
+        # anything else is written to the slot.
+        values = np.asarray(values)
+        if values.flags.c_contiguous:
+            address = values.ctypes.data if values.size else None
+            for block in self._blocks.values():
+                if self._address[block.name] == address:
+                    return block.name, len(values), values.dtype.str
+        view, spec = self.array(slot, len(values), values.dtype)
+        view[:] = values
+        return spec
+
+    def close(self):
+        for block in self._blocks.values():
+            block.unlink()
+            self._retired.append(block)
+        self._blocks = {}
+        self.close_retired()
+
+
+class SharedSpecies(Species):
+    # Species whose positions are in shared memory while the tile workers are running.
+    # Checkpoints store them as plain arrays, they are shared again when the workers start.
+    SHARED_FIELDS = ("x", "y")
+
+    def share(self, shared: SharedArrays, prefix: str):
+        self._shared, self._prefix = shared, prefix
+        self._move_fields()
+
+    def unshare(self):
+        self._shared = None
+        self._move_fields()
+
+    def _move_fields(self):
+        for name in self.SHARED_FIELDS:
+            old = getattr(self, name)
+            new = self._array(name, len(old), old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def _array(self, name: str, capacity: int, dtype):
+        if getattr(self, "_shared", None) is None or name not in self.SHARED_FIELDS:
+            return super()._array(name, capacity, dtype)
+        return self._shared.field(self._prefix + name, capacity, dtype)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_shared"] = None
+        for name in self.SHARED_FIELDS:
+            state[name] = np.array(state[name])
+        return state
+
+
+# Blocks a worker is attached to, by name
+_attached = {}
+
+def _view(spec):
+    name, length, dtype = spec
+    if name not in _attached:
+        # Workers share the master's resource tracker, the master alone unlinks the block
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(length, dtype=np.dtype(dtype), buffer=_attached[name].buf)
+
+def _detach_stale(specs):
+    # Blocks the master has replaced by bigger ones are closed here too
+    current = {spec[0] for spec in specs.values()}
+    for name in [name for name in _attached if name not in current]:
+        _attached.pop(name).close()
+
+
+#######################################
+###           Tile Workers          ###
+#######################################
+
+def _halo(ax, ay, rows, bx, by, radius: float, available=None):
+    # Points of b that can be within radius of the tile's rows: the bounding box of the rows plus radius.
+    # Points of b are kept in their original order, so ties break the same way as over all of b.
+    x, y = ax[rows], ay[rows]
+    near = (bx >= x.min() - radius) & (bx <= x.max() + radius) & (by >= y.min() - radius) & (by <= y.max() + radius)
+    if available is not None:
+        near &= available
+    return np.flatnonzero(near)
+
+def _nearest_task(task):
+    tile, specs, radius, exclude_self = task
+    _detach_stale(specs)
+    ax, ay, tile_of = _view(specs["ax"]), _view(specs["ay"]), _view(specs["tile"])
+    bx, by, available = _view(specs["bx"]), _view(specs["by"]), _view(specs["available"])
+    found = _view(specs["found"])
+
+    rows = np.flatnonzero(tile_of == tile)
+    if len(rows) == 0:
+        return
+    halo = _halo(ax, ay, rows, bx, by, radius, available.astype(bool))
+    if len(halo) == 0:
+        return
+    dist, _, _ = pairwise_distance(ax[rows], ay[rows], bx[halo], by[halo])
+    if exclude_self:
+        dist[rows[:, None] == halo[None, :]] = np.inf
+    nearest = nearest_within(dist, radius) if "rank" not in specs else first_within(dist, radius, _view(specs["rank"])[halo])
+    found[rows] = np.where(nearest >= 0, halo[np.maximum(nearest, 0)], -1)
+
+def _scent_task(task):
+    tile, specs, radius, _ = task
+    _detach_stale(specs)
+    ax, ay, tile_of = _view(specs["ax"]), _view(specs["ay"]), _view(specs["tile"])
+    sx, sy, strength = _view(specs["sx"]), _view(specs["sy"]), _view(specs["strength"])
+    vx, vy, has = _view(specs["vx"]), _view(specs["vy"]), _view(specs["has"])
+
+    rows = np.flatnonzero(tile_of == tile)
+    if len(rows) == 0:
+        return
+    halo = _halo(ax, ay, rows, sx, sy, radius)
+    sdist, sdx, sdy = pairwise_distance(ax[rows], ay[rows], sx[halo], sy[halo])
+    inside = sdist <= radius
+    weight = np.where(inside & (sdist > 10), sdist ** 3 * strength[halo].astype(float) ** 4 / 1200, 0)
+    vx[rows], vy[rows] = normalize((sdx * weight).sum(axis=1), (sdy * weight).sum(axis=1))
+    has[rows] = inside.any(axis=1)
+
+
+#######################################
+###           Tiled Engine          ###
+#######################################
+
+class TiledEngine(VectorEngine):
+    # VectorEngine for big worlds that uses several cores for the neighbour searches of one run.
+    # The world is split into a grid of tiles. Every neighbour search (prey, mates, grass, scent) is
+    # one task per tile on a pool of worker processes: a worker handles the agents inside its tile and
+    # looks at the other agents in a halo of `radius` around them, so searches across tile borders find
+    # the same neighbours. The workers read the agent positions in place from shared memory (SharedSpecies).
+    # Only the search phase is parallel. Everything else (movement, energy, births, deaths, recording,
+    # all random draws) stays in this process, so the base model gives the same result as the single-core
+    # engine. The scent vector sums fewer zero weights per fox and may differ in the last bits.
+    # The halo alone already makes a search cheaper than over all agents, with a single process too.
+    species_type = SharedSpecies
+
+    def __init__(self, config, recorder, model: str = "scent", foxes: int = 20, rabbits: int = 20, grass: int = 60,
+                 tiles=(2, 2), processes: int = None, min_pairs: int = 200_000):
+        self.tiles     = tuple(tiles)
+        self.processes = processes or os.cpu_count() or 1
+        # Searches with fewer point pairs than this run here, handing them out would cost more than it saves.
+        # Sweep-sized worlds (a few hundred agents) stay below it and never start the workers.
+        self.min_pairs = min_pairs
+        self._pool     = None
+        self._shared   = None
+        super().__init__(config, recorder, model, foxes, rabbits, grass)
+
+    def __getstate__(self):
+        # Checkpoints hold the simulation, the workers and shared memory are started again after a resume
+        state = dict(self.__dict__)
+        state["_pool"]   = None
+        state["_shared"] = None
+        return state
+
+    def _workers(self) -> SharedArrays:
+        if self._pool is None:
+            # Workers are spawned like the sweep workers, this process has used polars' thread pool by now.
+            # The resource tracker runs first, so the workers use it instead of starting their own.
+            resource_tracker.ensure_running()
+            self._pool   = mp.get_context("spawn").Pool(self.processes)
+            self._shared = SharedArrays()
+            for prefix, species in (("foxes.", self.foxes), ("rabbits.", self.rabbits), ("grass.", self.grass)):
+                species.share(self._shared, prefix)
+        return self._shared
+
+    def tick(self):
+        # The workers start at the beginning of the first tick with a search big enough for them,
+        # so the species fields move to shared memory while no method holds a view of them
+        if self._pool is None and self._largest_search() >= self.min_pairs:
+            self._workers()
+        elif self._shared is not None:
+            self._shared.close_retired()
+        super().tick()
+
+    def _largest_search(self) -> int:
+        f, r, g = self.foxes.n, self.rabbits.n, self.grass.n
+        scents = self.scent.size if self.scent is not None else 0
+        return max(f * r, f * f, r * r, r * g, f * scents)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            for species in (self.foxes, self.rabbits, self.grass):
+                species.unshare()
+            self._shared.close()
+            self._pool   = None
+            self._shared = None
+
+    def run(self):
+        try:
+            super().run()
+        finally:
+            self.close()
+
+    def _tile_of(self, ax, ay, active):
+        # Tile number of every active point, -1 for the others. Points just outside the world
+        # (moved but not wrapped yet) belong to the nearest tile.
+        nx, ny = self.tiles
+        ix = np.clip((ax * nx / self.width).astype(np.int64), 0, nx - 1)
+        iy = np.clip((ay * ny / self.height).astype(np.int64), 0, ny - 1)
+        return np.where(active, ix + nx * iy, -1)
+
+    def _dispatch(self, work, specs, radius: float, exclude_self: bool = False):
+        nx, ny = self.tiles
+        self._pool.map(work, [(tile, specs, radius, exclude_self) for tile in range(nx * ny)])
+
+    def _nearest(self, ax, ay, active, bx, by, radius: float, available=None, exclude_self: bool = False, rank=None):
+        if self._pool is None or np.count_nonzero(active) * len(bx) < self.min_pairs:
+            return super()._nearest(ax, ay, active, bx, by, radius, available, exclude_self, rank)
+
+        shared = self._shared
+        found, found_spec = shared.array("found", len(ax), np.int64)
+        found[:] = -1
+        specs = {
+            "ax":        shared.put("ax", ax),
+            "ay":        shared.put("ay", ay),
+            "tile":      shared.put("tile", self._tile_of(ax, ay, active)),
+            "bx":        shared.put("bx", bx),
+            "by":        shared.put("by", by),
+            "available": shared.put("available", np.ones(len(bx), dtype=np.int8) if available is None else available.astype(np.int8)),
+            "found":     found_spec,
+        }
+        if rank is not None:
+            specs["rank"] = shared.put("rank", rank)
+        self._dispatch(_nearest_task, specs, radius, exclude_self)
+        return found.copy()
+
+    def _scent_pull(self, ax, ay, radius: float):
+        s = self.scent
+        if self._pool is None or len(ax) * s.size < self.min_pairs:
+            return super()._scent_pull(ax, ay, radius)
+
+        shared = self._shared
+        vx, vx_spec = shared.array("vx", len(ax), np.float64)
+        vy, vy_spec = shared.array("vy", len(ax), np.float64)
+        has, has_spec = shared.array("has", len(ax), np.int8)
+        specs = {
+            "ax":       shared.put("ax", ax),
+            "ay":       shared.put("ay", ay),
+            "tile":     shared.put("tile", self._tile_of(ax, ay, np.ones(len(ax), dtype=bool))),
+            "sx":       shared.put("sx", s.x[:s.size]),
+            "sy":       shared.put("sy", s.y[:s.size]),
+            "strength": shared.put("strength", s.strength[:s.size]),
+            "vx":       vx_spec,
+            "vy":       vy_spec,
+            "has":      has_spec,
+        }
+        self._dispatch(_scent_task, specs, radius)
+        return vx.copy(), vy.copy(), has.astype(bool)
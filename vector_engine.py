@@ -0,0 +1,619 @@
+import os
+import pickle
+import sys
+import numpy as np
+from recorders import make_recorder
+from result_cache import config_key
+from rng import generator
+from early_stop import EarlyStop
+from scent_field import ScentField
+
+
+#######################################
+###         Species Buffers         ###
+#######################################
+
+class Species:
+    # Structure-of-arrays storage for one kind of agent.
+    # Every field is a flat NumPy buffer; only the first `n` entries are alive.
+
+    def __init__(self, fields: dict, capacity: int = 64):
+        self.fields = fields
+        self.n      = 0
+        for name, dtype in fields.items():
+            setattr(self, name, self._array(name, capacity, dtype))
+
+    def __len__(self):
+        return self.n
+
+    def _array(self, name: str, capacity: int, dtype):
+        # New buffer for a field, the tiled engine keeps some of them in shared memory
+        return np.zeros(capacity, dtype=dtype)
+
+    def _reserve(self, count: int):
+        # Double the buffers until `count` agents fit
+        capacity = len(getattr(self, next(iter(self.fields))))
+        if count <= capacity:
+            return
+        while capacity < count:
+            capacity *= 2
+        for name in self.fields:
+            old = getattr(self, name)
+            new = self._array(name, capacity, old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def spawn(self, **values):
+        # Append a batch of agents. Fields that are not given start at 0.
+        k = len(next(iter(values.values())))
+        self._reserve(self.n + k)
+        for name in self.fields:
+            if name in values:
+                getattr(self, name)[self.n:self.n + k] = values[name]
+            else:
+                getattr(self, name)[self.n:self.n + k] = 0
+        self.n += k
+
+    def compact(self, keep):
+        # Remove every agent for which keep is False
+        idx = np.flatnonzero(keep)
+        m = len(idx)
+        if m < self.n:
+            for name in self.fields:
+                arr = getattr(self, name)
+                arr[:m] = arr[idx]
+            self.n = m
+
+    def view(self, name: str):
+        return getattr(self, name)[:self.n]
+
+
+ANIMAL_FIELDS = {
+    "id": np.int64,
+    "x": np.float64, "y": np.float64,           # Position
+    "mx": np.float64, "my": np.float64,         # Movement vector
+    "age": np.int32,
+    "energy": np.int32,
+    "lifespan": np.int32,
+    "eat": np.int8,
+    "reproduce": np.int8,
+    "cell": np.int64,                           # Grid cell at the start of the frame, see VectorEngine._index_cells
+}
+
+GRASS_FIELDS = {
+    "id": np.int64,
+    "x": np.float64, "y": np.float64,
+    "state": np.int8,                           # 1 = available for consumption, 0 = eaten
+    "regrow_at": np.int32,                      # Frame at which eaten grass is available again
+    "t_reproduce": np.int32,
+    "cell": np.int64,
+}
+
+
+#######################################
+###             Helpers             ###
+#######################################
+
+def pairwise_distance(ax, ay, bx, by):
+    # Distance matrix between every point of a (rows) and every point of b (columns)
+    dx = bx[None, :] - ax[:, None]
+    dy = by[None, :] - ay[:, None]
+    return np.sqrt(dx * dx + dy * dy), dx, dy
+
+def nearest_within(dist, radius: float):
+    # Index of the nearest column within radius for every row, -1 if there is none
+    if dist.shape[1] == 0:
+        return np.full(dist.shape[0], -1)
+    nearest = dist.argmin(axis=1)
+    found = dist[np.arange(dist.shape[0]), nearest] <= radius
+    return np.where(found, nearest, -1)
+
+def first_within(dist, radius: float, rank):
+    # Index of the column with the lowest rank within radius for every row, -1 if there is none
+    if dist.shape[1] == 0:
+        return np.full(dist.shape[0], -1)
+    first = np.where(dist <= radius, rank[None, :], np.iinfo(np.int64).max).argmin(axis=1)
+    found = dist[np.arange(dist.shape[0]), first] <= radius
+    return np.where(found, first, -1)
+
+def scan_rank(cell):
+    # Position of every agent in the order NeighbourIndex visits them: by grid cell, then in the order they were added
+    rank = np.empty(len(cell), dtype=np.int64)
+    rank[np.argsort(cell, kind="stable")] = np.arange(len(cell))
+    return rank
+
+def first_claims(claims):
+    # Keep only the first claimant of every target, so a rabbit or grass is only eaten once
+    winners = np.zeros(len(claims), dtype=bool)
+    valid = np.flatnonzero(claims >= 0)
+    if len(valid):
+        _, first = np.unique(claims[valid], return_index=True)
+        winners[valid[first]] = True
+    return winners
+
+def scent_pull(ax, ay, scent: ScentField, radius: float):
+    # All scents that are too close are ignored, the others are weighted by distance and strength
+    sdist, sdx, sdy = pairwise_distance(ax, ay, scent.x[:scent.size], scent.y[:scent.size])
+    inside = sdist <= radius
+    weight = np.where(inside & (sdist > 10), sdist ** 3 * scent.strength[:scent.size].astype(float) ** 4 / 1200, 0)
+    vx, vy = normalize((sdx * weight).sum(axis=1), (sdy * weight).sum(axis=1))
+    return vx, vy, inside.any(axis=1)
+
+def rotate(mx, my, degrees):
+    # Rotate movement vectors by the given angles (in degrees), like Vector2.rotate_ip
+    rad = np.radians(degrees)
+    c, s = np.cos(rad), np.sin(rad)
+    return mx * c - my * s, mx * s + my * c
+
+def normalize(mx, my):
+    length = np.hypot(mx, my)
+    safe = np.where(length > 0, length, 1)
+    return mx / safe, my / safe
+
+
+#######################################
+###             Engine              ###
+#######################################
+
+class VectorEngine:
+    # Batched version of the fox/rabbit/grass model.
+    # Aging, metabolism, death, grazing, hunting, reproduction and random-walk movement
+    # are array operations over all agents of a species at once, in the same order
+    # Violet uses: first every agent moves (change_position), then every agent updates.
+    species_type = Species
+
+    def __init__(self, config, recorder, model: str = "scent", foxes: int = 20, rabbits: int = 20, grass: int = 60):
+        self.config = config
+        self.model  = model
+        self.rng    = generator(config.seed, "vector")
+        self.frame  = 0
+        self.next_id = 0
+
+        self.width, self.height = config.window.as_tuple()
+
+        self.foxes   = self.species_type(ANIMAL_FIELDS)
+        self.rabbits = self.species_type(ANIMAL_FIELDS)
+        self.grass   = self.species_type(GRASS_FIELDS)
+        self.scent   = ScentField(config.scent) if model == "scent" else None
+
+        self.recorder = recorder
+        self.early_stop = EarlyStop(config)
+
+        # Where run() saves a checkpoint every checkpoint_every frames, None to never save one
+        self.checkpoint_path  = None
+        self.checkpoint_every = 60 * 60
+
+        self._spawn_animals(self.foxes, foxes, config.fox_lifespan, self._start_energy(config.fox_hunger_threshold))
+        self._spawn_animals(self.rabbits, rabbits, config.rabbit_lifespan, self._start_energy(config.rabbit_hunger_threshold))
+
+        t_reproduce = config.grass_t_reproduce + self.rng.normal(60, 20, grass).astype(np.int32)
+        self.grass.spawn(
+            id=self._ids(grass),
+            x=self.rng.uniform(1, self.width, grass), y=self.rng.uniform(1, self.height, grass),
+            state=np.ones(grass), regrow_at=np.full(grass, -1), t_reproduce=t_reproduce,
+        )
+
+    def _start_energy(self, hunger_threshold: int) -> int:
+        # The scent model starts animals one tick below their hunger threshold
+        return hunger_threshold - 1 if self.model == "scent" else hunger_threshold
+
+    def _ids(self, count: int):
+        ids = np.arange(self.next_id, self.next_id + count)
+        self.next_id += count
+        return ids
+
+    def _spawn_animals(self, species: Species, count: int, lifespan: int, energy: int, parents=None):
+        if count == 0:
+            return
+        # Lifespans are randomised a bit, like Agent.on_spawn does with random.gauss
+        noise = np.abs(self.rng.normal(1, 0.25, count))
+        if parents is None:
+            x, y = None, None
+            angle = self.rng.uniform(0, 360, count)
+            mx, my = rotate(np.full(count, float(self.config.movement_speed)), np.zeros(count), angle)
+        else:
+            # Children are copies of their parent's position and movement vector, like Agent.reproduce
+            x, y = species.x[parents], species.y[parents]
+            mx, my = species.mx[parents], species.my[parents]
+        species.spawn(
+            id=self._ids(count),
+            x=self.rng.uniform(0, self.width, count) if x is None else x,
+            y=self.rng.uniform(0, self.height, count) if y is None else y,
+            mx=mx, my=my,
+            energy=np.full(count, energy),
+            lifespan=(lifespan * noise).astype(np.int32),
+        )
+
+    def _wrap(self, species: Species, mask=None):
+        # Agent.there_is_no_escape: teleport agents that left the area to the opposite edge.
+        # mask limits it to the agents that call there_is_no_escape this tick
+        x, y = species.view("x"), species.view("y")
+        changed = (x < 0) | (x > self.width) | (y < 0) | (y > self.height)
+        if mask is not None:
+            changed &= mask
+        x[:] = np.where(changed & (x < 0), self.width, np.where(changed & (x > self.width), 0, x))
+        y[:] = np.where(changed & (y < 0), self.height, np.where(changed & (y > self.height), 0, y))
+        return changed
+
+    def _wander(self, species: Species, mask, changed):
+        # Random walk of Agent.change_position: turn when teleported and sometimes turn a bit
+        idx = np.flatnonzero(mask)
+        if len(idx) == 0:
+            return
+
+        k = len(idx)
+        teleport_deg = self.rng.uniform(-30, 30, k)
+        should_change_angle = self.rng.random(k)
+        deg = self.rng.uniform(-10, 10, k)
+        deg = np.where(changed[idx], teleport_deg, 0) + np.where(should_change_angle < 0.25, deg, 0)
+        species.mx[idx], species.my[idx] = rotate(species.mx[idx], species.my[idx], deg)
+
+    #######################################
+    ###        Neighbour queries        ###
+    #######################################
+
+    def _nearest(self, ax, ay, active, bx, by, radius: float, available=None, exclude_self: bool = False, rank=None):
+        # For every active point of a: index of the nearest point of b within radius, -1 if there is none
+        # or the point isn't active. available restricts the points of b that count,
+        # exclude_self skips the point with the same index (a and b are the same agents).
+        # With a rank per point of b, the lowest ranked point within radius is taken instead of the nearest.
+        found = np.full(len(ax), -1)
+        rows = np.flatnonzero(active)
+        if len(rows) == 0:
+            return found
+        dist, _, _ = pairwise_distance(ax[rows], ay[rows], bx, by)
+        if available is not None:
+            dist[:, ~available] = np.inf
+        if exclude_self:
+            dist[np.arange(len(rows)), rows] = np.inf
+        found[rows] = nearest_within(dist, radius) if rank is None else first_within(dist, radius, rank)
+        return found
+
+    def _index_cells(self):
+        # The grid cell of every agent at the start of the frame, the cell NeighbourIndex puts it in
+        for species in (self.foxes, self.rabbits, self.grass):
+            cx = np.floor(species.view("x") / self.config.radius).astype(np.int64)
+            cy = np.floor(species.view("y") / self.config.radius).astype(np.int64)
+            species.view("cell")[:] = (cx << 32) + cy
+
+    def _first_of(self, species: Species):
+        # Rank of the agents in the order Neighbours.first comes across them
+        return scan_rank(species.view("cell"))
+
+    def _scent_pull(self, ax, ay, radius: float):
+        # Direction of the weighted scent vector around every point and whether there is any scent in radius
+        return scent_pull(ax, ay, self.scent, radius)
+
+    #######################################
+    ###         Movement phase          ###
+    #######################################
+
+    def move_foxes(self):
+        c, f, r = self.config, self.foxes, self.rabbits
+        n = f.n
+        f.eat[:n] = 0
+        if n == 0:
+            return
+        # The scent model wraps every fox before it looks around, the base model only the foxes that wander
+        if self.model == "scent":
+            changed = self._wrap(f)
+
+        # The base model hunts the first rabbit it comes across, the scent model the nearest one (Fox.sense)
+        hungry = f.view("energy") < c.fox_hunger_threshold
+        target = self._nearest(f.view("x"), f.view("y"), hungry, r.view("x"), r.view("y"), c.radius,
+                               rank=self._first_of(r) if self.model != "scent" else None)
+        if self.model != "scent":
+            changed = self._wrap(f, target < 0)
+        # Vector from every fox to its target (unused for foxes without one)
+        dx = r.x[np.maximum(target, 0)] - f.x[:n]
+        dy = r.y[np.maximum(target, 0)] - f.y[:n]
+        target_dist = np.where(target >= 0, np.sqrt(dx * dx + dy * dy), np.inf)
+
+        # Foxes that are close enough eat the rabbit, one fox per rabbit
+        eats = first_claims(np.where(target_dist < 20, target, -1))
+        if eats.any():
+            f.energy[:n][eats] = np.minimum(f.energy[:n][eats] + c.rabbit_nutrition, c.fox_energy)
+            f.eat[:n][eats] = 1
+            eaten = np.zeros(r.n, dtype=bool)
+            eaten[target[eats]] = True
+            if self.scent is not None:
+                self.scent.drop_owners(r.view("id")[eaten])
+            r.compact(~eaten)
+
+        # The others chase the rabbit
+        chase = (target >= 0) & (target_dist >= 20)
+        rows = np.flatnonzero(chase)
+        if len(rows) and self.model == "scent":
+            # by following its relative position vector
+            ux, uy = normalize(dx[rows], dy[rows])
+            f.mx[:n][rows], f.my[:n][rows] = ux * c.hunt_movespeed, uy * c.hunt_movespeed
+        elif len(rows):
+            # by turning (hunt_movespeed, 0) by pos.angle_to(rabbit.pos), the angle between the two
+            # position vectors as seen from the origin, which is what the base model does
+            tx, ty = r.x[target[rows]], r.y[target[rows]]
+            angle = np.degrees(np.arctan2(ty, tx) - np.arctan2(f.y[rows], f.x[rows]))
+            f.mx[:n][rows], f.my[:n][rows] = rotate(np.full(len(rows), float(c.hunt_movespeed)), np.zeros(len(rows)), angle)
+
+        track = np.zeros(n, dtype=bool)
+        if self.scent is not None and len(self.scent):
+            # Hungry foxes without a rabbit in sight follow the weighted scent vector
+            candidates = np.flatnonzero(hungry & (target < 0))
+            if len(candidates):
+                vx, vy, has_scent = self._scent_pull(f.x[candidates], f.y[candidates], c.radius)
+                rows = candidates[has_scent]
+                f.mx[rows] += 0.7 * 0.3 * vx[has_scent]
+                f.my[rows] += 0.7 * 0.3 * vy[has_scent]
+                track[rows] = True
+
+        # Foxes that are not hungry walk around randomly. In the base model so does every fox without
+        # a rabbit in range, in the scent model a hungry fox keeps going the way it went.
+        # A scent fox was wrapped before it looked around, so its second there_is_no_escape never turns it
+        if self.model == "scent":
+            self._wander(f, ~hungry, np.zeros(n, dtype=bool))
+        else:
+            self._wander(f, target < 0, changed)
+
+        if self.model == "scent":
+            # The scent model normalises the movement and scales it by the current speed
+            f.mx[:n], f.my[:n] = normalize(f.mx[:n], f.my[:n])
+            speed = np.where(chase, c.hunt_movespeed, np.where(track, c.track_movespeed, 1.0))
+            f.mx[:n] *= speed
+            f.my[:n] *= speed
+
+        f.x[:n] += f.mx[:n]
+        f.y[:n] += f.my[:n]
+
+    def move_rabbits(self):
+        r = self.rabbits
+        changed = self._wrap(r)
+        self._wander(r, np.ones(r.n, dtype=bool), changed)
+        r.x[:r.n] += r.mx[:r.n]
+        r.y[:r.n] += r.my[:r.n]
+
+    #######################################
+    ###          Update phase           ###
+    #######################################
+
+    def _age(self, species: Species):
+        # Aging and metabolism, returns which agents die this tick
+        species.view("age")[:] += 1
+        species.view("energy")[:] -= 1
+        return (species.view("age") == species.view("lifespan")) | (species.view("energy") == 0)
+
+    def _breed(self, species: Species, parents, dies, lifespan: int, energy: int):
+        # Children are spawned at their parent's position, behind everyone else, then the dead are removed
+        n = species.n
+        self._spawn_animals(species, len(parents), lifespan, energy, parents)
+        species.compact(np.concatenate([~dies, np.ones(species.n - n, dtype=bool)]))
+
+    def _mate(self, species: Species, willing, p_reproduce: float, hunger_threshold: int):
+        # Willing agents with another agent of their kind within radius reproduce with probability p_reproduce
+        n = species.n
+        species.reproduce[:n] = 0
+        rows = np.flatnonzero(willing)
+        if len(rows) == 0:
+            return rows, rows
+        # The nearest other agent of the same kind, ignoring yourself
+        x, y = species.view("x"), species.view("y")
+        partner = self._nearest(x, y, willing, x, y, self.config.radius, exclude_self=True,
+                                rank=self._first_of(species))[rows]
+        success = (partner >= 0) & (self.rng.random(len(rows)) < p_reproduce)
+
+        # The models update the agents one after the other, in the order of the buffers. A partner
+        # whose turn comes later has its energy set below the hunger threshold by then: it doesn't
+        # reproduce itself, its metabolism takes one more energy off and it may still eat.
+        # Only the successes are walked.
+        spent = np.zeros(n, dtype=bool)
+        parents, later = [], []
+        for parent, mate in zip(rows[success], partner[success]):
+            if spent[parent]:
+                continue
+            parents.append(parent)
+            if mate > parent:
+                spent[mate] = True
+                later.append(mate)
+        parents, later = np.array(parents, dtype=np.int64), np.array(later, dtype=np.int64)
+
+        species.energy[partner[success]] = hunger_threshold - 1
+        species.energy[parents] = hunger_threshold - 1
+        species.energy[later]   = hunger_threshold - 2
+        species.reproduce[parents] = 1
+        return parents, later
+
+    def update_foxes(self):
+        c, f = self.config, self.foxes
+        dies = self._age(f)
+        # A fox that dies this tick still carries on with the rest of its update, like Fox.update after kill()
+        willing = f.view("energy") > c.fox_hunger_threshold
+        parents, _ = self._mate(f, willing, c.fox_p_reproduce, c.fox_hunger_threshold)
+        self._record("fox", f)
+        self._breed(f, parents, dies, c.fox_lifespan, self._start_energy(c.fox_hunger_threshold))
+
+    def update_rabbits(self):
+        c, r = self.config, self.rabbits
+        n = r.n
+        dies = self._age(r)
+        r.eat[:n] = 0
+
+        # Hungry rabbits eat grass, one rabbit per patch. A rabbit that dies this tick still eats and reproduces
+        eats = self._eat_grass(r.view("energy") < c.rabbit_hunger_threshold)
+
+        # Rabbits that are not hungry attempt reproduction
+        willing = (r.view("energy") > c.rabbit_hunger_threshold) & ~eats
+        parents, later = self._mate(r, willing, c.rabbit_p_reproduce, c.rabbit_hunger_threshold)
+
+        # Partners whose turn came after the mating are hungry by then and look for grass themselves
+        if len(later):
+            hungry = np.zeros(n, dtype=bool)
+            hungry[later] = True
+            self._eat_grass(hungry)
+
+        # Drop scent each scent_interval
+        if self.scent is not None:
+            drops = (r.view("age") % c.scent_interval == 0) & ~dies
+            self.scent.deposit_many(r.view("id")[drops], r.view("x")[drops], r.view("y")[drops])
+            self.scent.drop_owners(r.view("id")[dies])
+
+        self._record("rabbit", r)
+        self._breed(r, parents, dies, c.rabbit_lifespan, self._start_energy(c.rabbit_hunger_threshold))
+
+    def _eat_grass(self, hungry):
+        # The first grass within radius of every hungry rabbit, eaten by the first rabbit that finds it.
+        # The base model only looks at available grass, the scent model takes the first patch it comes
+        # across (Neighbours.first(Grass)) and only eats it when it is available. Returns who ate.
+        c, r, g = self.config, self.rabbits, self.grass
+        n = r.n
+        available = g.view("state") == 1
+        rank = self._first_of(g)
+        # Grass eaten this tick has moved away, the rabbits after the one that ate it look past it
+        gone = np.zeros(g.n, dtype=bool)
+        ate = np.zeros(n, dtype=bool)
+        while hungry.any():
+            patch = self._nearest(r.view("x"), r.view("y"), hungry, g.view("x"), g.view("y"), c.radius,
+                                  (available if self.model != "scent" else True) & ~gone, rank=rank)
+            eats = first_claims(patch)
+            eats[eats] = available[patch[eats]]
+            if eats.any():
+                r.energy[:n][eats] = np.minimum(r.energy[:n][eats] + c.grass_nutrition, c.rabbit_energy)
+                r.eat[:n][eats] = 1
+                self._graze(patch[eats])
+                gone[patch[eats]] = True
+                ate |= eats
+            # Rabbits that found a patch someone before them ate look again
+            lost = np.flatnonzero((patch >= 0) & ~eats)
+            hungry = np.zeros(n, dtype=bool)
+            hungry[lost] = gone[patch[lost]]
+        return ate
+
+    def _graze(self, patches):
+        # Eaten grass moves to a random position and becomes unavailable for t_reproduce frames
+        g = self.grass
+        k = len(patches)
+        g.state[patches] = 0
+        g.x[patches] = self.rng.uniform(1, self.width, k)
+        g.y[patches] = self.rng.uniform(1, self.height, k)
+        g.regrow_at[patches] = self.frame + g.t_reproduce[patches]
+        self._record_grass(patches, "grass")
+
+    def regrow_grass(self):
+        # Grass that is due grows back before any agent looks at it this frame
+        g = self.grass
+        due = np.flatnonzero((g.view("state") == 0) & (g.view("regrow_at") <= self.frame))
+        if len(due):
+            g.state[due] = 1
+            self._record_grass(due, "dead_grass")
+
+    def _record_grass(self, patches, previous: str):
+        # Grass only writes rows when its state changes, like the Violet models
+        g = self.grass
+        k = len(patches)
+        zeros = np.zeros(k, dtype=np.int32)
+        self.recorder.record_changes(
+            previous=np.full(k, previous),
+            frame=np.full(k, self.frame, dtype=np.int32),
+            id=g.id[patches],
+            x=np.round(g.x[patches]).astype(np.int16),
+            y=np.round(g.y[patches]).astype(np.int16),
+            agent=np.where(g.state[patches] == 1, "grass", "dead_grass"),
+            age=zeros, max_lifespan=zeros, energy=zeros, reproduce=zeros, eat=zeros,
+        )
+
+    def _record(self, agent: str, species: Species):
+        n = species.n
+        self.recorder.record_many(
+            frame=np.full(n, self.frame, dtype=np.int32),
+            id=species.view("id").copy(),
+            x=np.round(species.view("x")).astype(np.int16),
+            y=np.round(species.view("y")).astype(np.int16),
+            agent=np.full(n, agent),
+            age=species.view("age").copy(),
+            max_lifespan=species.view("lifespan").copy(),
+            energy=species.view("energy").copy(),
+            reproduce=species.view("reproduce").copy(),
+            eat=species.view("eat").copy(),
+        )
+
+    def tick(self):
+        if self.frame == 0:
+            self._record_grass(np.arange(self.grass.n), "")
+        self.regrow_grass()
+        self._index_cells()
+        self.move_foxes()
+        self.move_rabbits()
+        self.update_foxes()
+        self.update_rabbits()
+        if self.scent is not None:
+            self.scent.decay()
+        self.recorder.end_frame(self.frame)
+        self.frame += 1
+
+    def run(self):
+        # Violet runs frames 0 up to and including the duration
+        while self.frame <= self.config.duration:
+            self.tick()
+            if self.early_stop.enabled:
+                reason = self.early_stop.after_frame(len(self.foxes), len(self.rabbits))
+                if reason is not None:
+                    self.recorder.stopped(self.frame - 1, reason)
+                    break
+            if self.checkpoint_path is not None and self.frame % self.checkpoint_every == 0 and self.frame <= self.config.duration:
+                self.save(self.checkpoint_path)
+
+    def save(self, path: str):
+        # The whole engine (buffers, generator, recorder) is the checkpoint
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+
+########################################
+###            Simulation            ###
+########################################
+
+def make_simulation(config, model: str = None, out_dir: str = "snapshots", recording: str = "snapshots",
+                    checkpoint_dir: str = None, checkpoint_every: int = 60 * 60,
+                    foxes: int = 20, rabbits: int = 20, grass: int = 60,
+                    tiles=None, processes: int = None) -> VectorEngine:
+    # An engine that is ready to run: either freshly spawned with the given population,
+    # or restored from the latest checkpoint in checkpoint_dir. The model defaults to the config's,
+    # where a sweep names this engine's models vector_base and vector_scent.
+    # With tiles=(nx, ny) one run uses several cores, see tiled_engine.py.
+    model = (model or config.model).removeprefix("vector_")
+    engine = None
+    checkpoint_path = None
+    if checkpoint_dir is not None:
+        key = config_key(config, sys.modules[__name__], recording+"/"+model+"/"+str((foxes, rabbits, grass))+"/"+str(tiles))
+        checkpoint_path = os.path.join(checkpoint_dir, key + ".ckpt")
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "rb") as f:
+                engine = pickle.load(f)
+            print("Resuming simulation ID "+str(config.id)+" from frame "+str(engine.frame))
+
+    if engine is None:
+        recorder = make_recorder(recording, os.path.join(out_dir, "vector_"+model+"_run_"+str(config.id)))
+        if tiles is None:
+            engine = VectorEngine(config, recorder, model, foxes, rabbits, grass)
+        else:
+            from tiled_engine import TiledEngine
+            engine = TiledEngine(config, recorder, model, foxes, rabbits, grass, tiles, processes)
+    engine.checkpoint_path  = checkpoint_path
+    engine.checkpoint_every = checkpoint_every
+    return engine
+
+def run_simulation(config, model: str = None, out_dir: str = "snapshots", recording: str = "snapshots",
+                   checkpoint_dir: str = None, checkpoint_every: int = 60 * 60,
+                   foxes: int = 20, rabbits: int = 20, grass: int = 60,
+                   tiles=None, processes: int = None):
+    # Same recording modes and checkpointing as the agent models: a snapshot directory path or a counts DataFrame
+    engine = make_simulation(config, model, out_dir, recording, checkpoint_dir, checkpoint_every, foxes, rabbits, grass,
+                             tiles, processes)
+    engine.run()
+    result = engine.recorder.close()
+    # No checkpoint is written by runs shorter than checkpoint_every or stopped early before one
+    if engine.checkpoint_path is not None and os.path.exists(engine.checkpoint_path):
+        os.remove(engine.checkpoint_path)
+    print()
+    print("Finished! Simulation ID "+str(config.id))
+    print()
+    return result
@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import multiprocessing as mp
+import serde
+import AllMatrixes
+from parameters import model_module
+from result_cache import ResultCache, config_key
+from sweep import estimated_cost
+
+
+#######################################
+###            Work Queue           ###
+#######################################
+
+class WorkQueue:
+    # Sweep jobs in a SQLite database on a filesystem every node can reach.
+    # A coordinator publishes configs, workers on any machine claim them with a lease,
+    # keep the lease alive while they run, and mark the job done once the result is in the cache.
+    # When a worker dies its lease runs out and the job is claimed again, up to max_attempts times.
+
+    def __init__(self, path: str, lease: float = 10 * 60, max_attempts: int = 3):
+        self.path         = path
+        self.lease        = lease
+        self.max_attempts = max_attempts
+        db = self._connect()
+        try:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    key         TEXT PRIMARY KEY,
+                    model       TEXT NOT NULL,
+                    config      TEXT NOT NULL,
+                    cost        INTEGER NOT NULL,
+                    state       TEXT NOT NULL DEFAULT 'pending',
+                    attempts    INTEGER NOT NULL DEFAULT 0,
+                    worker      TEXT,
+                    lease_until REAL,
+                    error       TEXT
+                )""")
+        finally:
+            db.close()
+
+    def _connect(self):
+        # Autocommit connection; writes take the database lock with BEGIN IMMEDIATE
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        db.execute("PRAGMA busy_timeout = 60000")
+        return db
+
+    def publish(self, configs, cache: ResultCache = None) -> list:
+        # Add the configs as jobs and return their keys. Every config runs with the model it names.
+        # Jobs that are pending or running are left alone. Jobs that failed before, and jobs that are done
+        # but whose result is not in the cache (any more), are run again with all their attempts.
+        keys = [config_key(config, model_module(config.model)) for config in configs]
+        rows = [(key, config.model, json.dumps(serde.to_dict(config)), estimated_cost(config)) for key, config in zip(keys, configs)]
+        missing = [(key, cache is None or not os.path.exists(cache.path(key))) for key in keys]
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany("INSERT OR IGNORE INTO jobs (key, model, config, cost) VALUES (?, ?, ?, ?)", rows)
+            db.executemany("""
+                UPDATE jobs SET state = 'pending', attempts = 0, worker = NULL, lease_until = NULL, error = NULL
+                WHERE key = ? AND (state = 'failed' OR (state = 'done' AND ?))""", missing)
+            db.execute("COMMIT")
+        finally:
+            db.close()
+        return keys
+
+    def claim(self, worker: str):
+        # The most expensive job that is pending or whose lease has expired, as (key, model, config)
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            # Jobs whose worker died on the last attempt won't be retried
+            db.execute("""
+                UPDATE jobs SET state = 'failed', error = 'Lease expired on the last attempt'
+                WHERE state = 'running' AND lease_until < ? AND attempts >= ?""", (time.time(), self.max_attempts))
+            row = db.execute("""
+                SELECT key, model, config FROM jobs
+                WHERE (state = 'pending' OR (state = 'running' AND lease_until < ?)) AND attempts < ?
+                ORDER BY cost DESC LIMIT 1""", (time.time(), self.max_attempts)).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET state = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE key = ?",
+                           (worker, time.time() + self.lease, row[0]))
+            db.execute("COMMIT")
+        finally:
+            db.close()
+        if row is None:
+            return None
+        key, model, config = row
+        return key, model, serde.from_dict(AllMatrixes.AllConfig, json.loads(config))
+
+    def _update(self, sql: str, args):
+        db = self._connect()
+        try:
+            db.execute(sql, args)
+        finally:
+            db.close()
+
+    def heartbeat(self, key: str, worker: str):
+        self._update("UPDATE jobs SET lease_until = ? WHERE key = ? AND worker = ? AND state = 'running'",
+                     (time.time() + self.lease, key, worker))
+
+    def complete(self, key: str, worker: str):
+        self._update("UPDATE jobs SET state = 'done', lease_until = NULL WHERE key = ? AND worker = ?", (key, worker))
+
+    def fail(self, key: str, worker: str, error: str):
+        # Back to pending for another attempt, or failed for good after max_attempts
+        self._update("""
+            UPDATE jobs SET state = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, error = ?, lease_until = NULL
+            WHERE key = ? AND worker = ?""", (self.max_attempts, error, key, worker))
+
+    def status(self) -> dict:
+        # Number of jobs per state
+        db = self._connect()
+        try:
+            return dict(db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        finally:
+            db.close()
+
+    def states(self, keys) -> dict:
+        db = self._connect()
+        try:
+            rows = db.execute("SELECT key, state, error FROM jobs").fetchall()
+        finally:
+            db.close()
+        wanted = set(keys)
+        return {key: (state, error) for key, state, error in rows if key in wanted}
+
+    def wait(self, keys, poll: float = 5):
+        # Yields every key once its job is done, raises when a job failed for good
+        remaining = set(keys)
+        while remaining:
+            for key, (state, error) in self.states(remaining).items():
+                if state == "done":
+                    remaining.discard(key)
+                    yield key
+                elif state == "failed":
+                    raise RuntimeError("Sweep job "+key+" failed:\n"+str(error))
+            if remaining:
+                time.sleep(poll)
+
+
+#######################################
+###             Workers             ###
+#######################################
+
+class _Heartbeat(threading.Thread):
+    # Keeps the lease of a running job alive from the background while the simulation runs
+
+    def __init__(self, queue: WorkQueue, key: str, worker: str):
+        super().__init__(daemon=True)
+        self.queue   = queue
+        self.key     = key
+        self.worker  = worker
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.queue.lease / 3):
+            self.queue.heartbeat(self.key, self.worker)
+
+
+def run_worker(queue_path: str, cache_root: str = "cache", checkpoint_dir: str = "checkpoints", poll: float = 10):
+    # Claim and run jobs until the queue has nothing left that could still be claimed.
+    # Results go to the shared result cache under the same key the driver uses to look them up,
+    # and checkpoints to a shared directory, so a job claimed again after a crash resumes where it was.
+    queue = WorkQueue(queue_path)
+    cache = ResultCache(cache_root)
+    worker = "%s:%d" % (socket.gethostname(), os.getpid())
+
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            status = queue.status()
+            if status.get("pending", 0) == 0 and status.get("running", 0) == 0:
+                return
+            # Jobs are still running elsewhere and may come back if their worker dies
+            time.sleep(poll)
+            continue
+
+        key, model, config = job
+        heartbeat = _Heartbeat(queue, key, worker)
+        heartbeat.start()
+        try:
+            counts = model_module(model).run_simulation(config, recording="counts", checkpoint_dir=checkpoint_dir)
+            cache.put(key, counts, config)
+        except Exception:
+            queue.fail(key, worker, traceback.format_exc())
+        else:
+            queue.complete(key, worker)
+        finally:
+            heartbeat.stopped.set()
+
+
+if __name__ == "__main__":
+    # Run this on every node that should work on the sweep, e.g.
+    #   python work_queue.py worker --queue /shared/sweep.db --cache /shared/cache --processes 8
+    parser = argparse.ArgumentParser(description="Workers and status of a shared sweep work queue")
+    parser.add_argument("command", choices=["worker", "status"])
+    parser.add_argument("--queue", default="sweep.db", help="SQLite queue on a shared filesystem")
+    parser.add_argument("--cache", default="cache", help="result cache directory on a shared filesystem")
+    parser.add_argument("--checkpoints", default="checkpoints", help="checkpoint directory on a shared filesystem")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="local worker processes")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(WorkQueue(args.queue).status())
+    else:
+        workers = [mp.Process(target=run_worker, args=(args.queue, args.cache, args.checkpoints)) for _ in range(args.processes)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()